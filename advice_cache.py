@@ -0,0 +1,140 @@
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from lru import LRU
+
+# Bump whenever CBAA.budget_advice_prompt changes so old answers stop matching
+PROMPT_VERSION = 1
+
+
+def normalize(project_info):
+    return {
+        key: ' '.join(str(value).lower().split())
+        for key, value in sorted(project_info.items())
+    }
+
+
+def cache_key(project_info, version=PROMPT_VERSION):
+    payload = json.dumps({'v': version, 'info': normalize(project_info)}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SqliteTier:
+    """Persistent second tier so cached advice survives restarts.
+
+    Every purge_every writes, expired rows are deleted and the table is cut
+    back to the maxsize most recently written.
+    """
+
+    def __init__(self, path, maxsize=10000, purge_every=100):
+        self.path = path
+        self.maxsize = maxsize
+        self.purge_every = purge_every
+        self._writes = itertools.count(1)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS advice_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_advice_cache_expires_at ON advice_cache (expires_at)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM advice_cache WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, expires_at):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO advice_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, expires_at)
+            )
+        if next(self._writes) % self.purge_every == 0:
+            self.purge()
+
+    def purge(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM advice_cache WHERE expires_at <= ?', (time.time(),))
+            # Every row has the same TTL, so the earliest expiry is the least recently written
+            conn.execute(
+                'DELETE FROM advice_cache WHERE key IN ('
+                'SELECT key FROM advice_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+                (self.maxsize,)
+            )
+
+
+class AdviceCache:
+    """TTL + LRU cache of budget advice keyed on normalized project_info."""
+
+    def __init__(self, maxsize=1024, ttl=24 * 3600, persist_path=None, persist_maxsize=10000, enabled=True):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.persistent = SqliteTier(persist_path, persist_maxsize) if persist_path else None
+        self._entries = LRU(maxsize)
+        self.persistent_hits = 0
+
+    @property
+    def hits(self):
+        return self._entries.hits
+
+    def get(self, project_info):
+        key = cache_key(project_info)
+        now = time.time()
+        entry = self._entries.get(key, valid=lambda entry: entry[1] > now)
+        if entry is not None:
+            return entry[0]
+
+        value = self.persistent.get(key) if self.persistent else None
+        if value is not None:
+            with self._entries.lock:
+                self.persistent_hits += 1
+                self._entries.set(key, (value, now + self.ttl))
+        return value
+
+    def set(self, project_info, value):
+        key = cache_key(project_info)
+        expires_at = time.time() + self.ttl
+        self._entries.set(key, (value, expires_at))
+        if self.persistent:
+            self.persistent.set(key, value, expires_at)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        with self._entries.lock:
+            stats = self._entries.stats()
+            # A memory miss answered by the persistent tier is a hit overall
+            stats['misses'] -= self.persistent_hits
+            lookups = stats['hits'] + self.persistent_hits + stats['misses']
+            stats.update({
+                'enabled': self.enabled,
+                'ttl': self.ttl,
+                'persistent_hits': self.persistent_hits,
+                'hit_rate': round((stats['hits'] + self.persistent_hits) / lookups, 4) if lookups else 0.0
+            })
+            return stats
+
+
+advice_cache = AdviceCache(
+    maxsize=int(os.getenv('ADVICE_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('ADVICE_CACHE_TTL', 24 * 3600)),
+    persist_path=os.getenv('ADVICE_CACHE_DB') or None,
+    persist_maxsize=int(os.getenv('ADVICE_CACHE_DB_SIZE', 10000)),
+    enabled=os.getenv('ADVICE_CACHE_ENABLED', '1') != '0'
+)
@@ -0,0 +1,147 @@
+import datetime
+
+from sqlalchemy import func
+
+from lru import LRU
+from models import db, Expense
+from pagination import InvalidQuery
+
+# Labels for the burn-rate series, per backend
+PERIODS = {
+    'day': ('%Y-%m-%d', 'YYYY-MM-DD'),
+    'week': ('%Y-W%W', 'IYYY-"W"IW'),
+    'month': ('%Y-%m', 'YYYY-MM'),
+}
+
+# Expense categories that map onto a Budget's buckets; anything else is 'other'
+BUDGET_BUCKETS = ('mandatory', 'essential', 'discretionary')
+
+
+class ReportCache:
+    """Small LRU of computed reports, each stored with the table versions it was built from.
+
+    An entry is only returned while those versions are unchanged, so any
+    expense (or budget/project) write makes it stale in every process.
+    """
+
+    def __init__(self, maxsize=256):
+        self._entries = LRU(maxsize)
+
+    def get(self, key, versions):
+        entry = self._entries.get(key, valid=lambda entry: entry[0] == versions)
+        return entry[1] if entry is not None else None
+
+    def set(self, key, versions, report):
+        self._entries.set(key, (versions, report))
+
+    def stats(self):
+        return self._entries.stats()
+
+
+def period_label(column, period):
+    if period not in PERIODS:
+        raise InvalidQuery('period must be one of: %s' % ', '.join(PERIODS))
+    sqlite_format, postgres_format = PERIODS[period]
+    if db.engine.dialect.name == 'postgresql':
+        return func.to_char(column, postgres_format)
+    return func.strftime(sqlite_format, column)
+
+
+def category_rollup(criteria):
+    rows = db.session.query(
+        Expense.category, func.count(Expense.id), func.coalesce(func.sum(Expense.amount), 0.0)
+    ).filter(*criteria).group_by(Expense.category).order_by(func.sum(Expense.amount).desc()).all()
+    return [{'category': category, 'count': count, 'spent': round(spent, 2)} for category, count, spent in rows]
+
+
+def burn(criteria, period, remaining):
+    label = period_label(Expense.date, period)
+    rows = db.session.query(
+        label, func.count(Expense.id), func.sum(Expense.amount), func.min(Expense.date), func.max(Expense.date)
+    ).filter(*criteria).group_by(label).order_by(label).all()
+
+    series = []
+    cumulative = 0.0
+    for name, count, spent, _, _ in rows:
+        cumulative += spent
+        series.append({'period': name, 'count': count, 'spent': round(spent, 2), 'cumulative': round(cumulative, 2)})
+
+    daily_rate = None
+    runway_days = None
+    if rows:
+        first, last = rows[0][3], rows[-1][4]
+        days = max((last - first).total_seconds() / 86400.0, 1.0)
+        daily_rate = cumulative / days
+        if remaining is not None and daily_rate > 0:
+            runway_days = round(max(remaining, 0.0) / daily_rate, 1)
+        daily_rate = round(daily_rate, 2)
+    return {'period': period, 'series': series, 'daily_rate': daily_rate, 'runway_days': runway_days}
+
+
+def variance(planned, spent):
+    return {
+        'planned': planned,
+        'spent': round(spent, 2),
+        'variance': round(planned - spent, 2) if planned is not None else None,
+        'spent_pct': round(100.0 * spent / planned, 2) if planned else None
+    }
+
+
+def budget_report(budget, period='week', since=None, until=None):
+    """Spend by a budget's owner against its mandatory/essential/discretionary buckets.
+
+    Budgets aren't linked to expenses directly, so a budget covers the
+    expenses its creator recorded from the budget's creation (or ``since``).
+    Expense categories named after a bucket count against it; the rest are
+    reported under 'other'.
+    """
+    since = since or budget.created_at
+    criteria = [Expense.created_by == budget.created_by, Expense.date >= since]
+    if until:
+        criteria.append(Expense.date < until)
+
+    categories = category_rollup(criteria)
+    spent = sum(row['spent'] for row in categories)
+    by_bucket = dict.fromkeys(BUDGET_BUCKETS + ('other',), 0.0)
+    for row in categories:
+        bucket = row['category'].lower()
+        by_bucket[bucket if bucket in BUDGET_BUCKETS else 'other'] += row['spent']
+
+    buckets = []
+    for bucket in BUDGET_BUCKETS:
+        buckets.append(dict(bucket=bucket, **variance(getattr(budget, bucket) or 0.0, by_bucket[bucket])))
+    buckets.append(dict(bucket='other', **variance(0.0, by_bucket['other'])))
+
+    report = {
+        'budget_id': budget.id,
+        'name': budget.name,
+        'since': since.isoformat() if isinstance(since, datetime.datetime) else since,
+        'until': until.isoformat() if until else None,
+        'buckets': buckets,
+        'categories': categories,
+        'burn': burn(criteria, period, budget.total - spent)
+    }
+    report.update(variance(budget.total, spent))
+    return report
+
+
+def project_spend(project, period='week', since=None, until=None):
+    """Expenses recorded against a project, compared with its budget."""
+    criteria = [Expense.project_id == project.id]
+    if since:
+        criteria.append(Expense.date >= since)
+    if until:
+        criteria.append(Expense.date < until)
+
+    categories = category_rollup(criteria)
+    spent = sum(row['spent'] for row in categories)
+    report = {
+        'project_id': project.id,
+        'project_title': project.title,
+        'since': since.isoformat() if since else None,
+        'until': until.isoformat() if until else None,
+        'categories': categories,
+        'burn': burn(criteria, period, project.budget - spent if project.budget is not None else None)
+    }
+    report.update(variance(project.budget, spent))
+    return report
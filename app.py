@@ -1,81 +1,193 @@
-from flask import Flask, request, jsonify, session
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, session, stream_with_context
 from functools import wraps
-import datetime
-from models import db, ChatSession, ChatMessage  
+import json
+import time
+from urllib.parse import urlencode
+import os
+import click
+from flask.cli import with_appcontext
+import migrate
+from sqlalchemy import inspect, or_, update
+from models import db, User, Project, Contribution, Vote, Budget, Expense, ChatMessage, ProjectStats
+from cba import CBAA, CONTEXT, chat_pool
+from executor import BoundedExecutor, ExecutorTimeout, Saturated
+from advice_cache import advice_cache
+from pagination import InvalidQuery, keyset_page, add_page_headers, parse_datetime, parse_int
+import stats
+import database
+import versions
+import passwords
+import bulk
+from export import export_response
+import serializers
+import metrics
+import references
+import analytics
+import ratelimit
+import seed
+import search
+import changes
+
+
+api = Blueprint('api', __name__)
+
+
+def create_app(test_config=None):
+    # Initialize Flask app
+    app = Flask(__name__)
+
+    # Configuration
+    app.config['SECRET_KEY'] = '385-342-391'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # LLM calls run on a bounded pool so slow chats can't starve the CRUD routes
+    app.config['LLM_WORKERS'] = 4
+    app.config['LLM_QUEUE'] = 16
+    app.config['LLM_TIMEOUT'] = 30
+    # Per user (or IP when logged out): chat requests per second, burst size and concurrent replies.
+    # Set CHAT_RATE_LIMIT_DB to share the buckets between worker processes.
+    app.config['CHAT_RATE'] = float(os.getenv('CHAT_RATE', 0.5))
+    app.config['CHAT_BURST'] = int(os.getenv('CHAT_BURST', 10))
+    app.config['CHAT_MAX_CONCURRENT'] = int(os.getenv('CHAT_MAX_CONCURRENT', 2))
+    app.config['CHAT_RATE_LIMIT_DB'] = os.getenv('CHAT_RATE_LIMIT_DB') or None
+    # Password hashing is CPU-bound, so it gets its own pool sized to the machine
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', passwords.DEFAULT_METHOD)
+    app.config['HASH_WORKERS'] = os.cpu_count() or 2
+    app.config['HASH_QUEUE'] = 64
+    app.config['HASH_TIMEOUT'] = 10
+    # Seconds a username/project title -> id lookup is reused by the create routes
+    app.config['REFERENCE_CACHE_TTL'] = int(os.getenv('REFERENCE_CACHE_TTL', 30))
+    # GET /changes: entries kept in change_log, and the longest a poll (there or /chat/history) blocks
+    app.config['CHANGE_LOG_RETAIN'] = int(os.getenv('CHANGE_LOG_RETAIN', 10000))
+    app.config['CHANGES_MAX_WAIT'] = int(os.getenv('CHANGES_MAX_WAIT', 25))
+    if test_config:
+        app.config.update(test_config)
+    # DATABASE_URL (SQLite or PostgreSQL), pool sizing and SQLite pragmas
+    database.configure(app)
+    serializers.install_json_provider(app)
+
+    db.init_app(app)
+    database.install_pragmas(app)
+    # Route latency, SQL counts and the opt-in X-Profile header
+    metrics.install(app)
+    app.extensions['llm_executor'] = BoundedExecutor(
+        max_workers=app.config['LLM_WORKERS'],
+        max_queue=app.config['LLM_QUEUE'],
+        timeout=app.config['LLM_TIMEOUT'],
+        name='llm'
+    )
+    app.extensions['hash_executor'] = BoundedExecutor(
+        max_workers=app.config['HASH_WORKERS'],
+        max_queue=app.config['HASH_QUEUE'],
+        timeout=app.config['HASH_TIMEOUT'],
+        name='hash'
+    )
+    app.extensions['reference_cache'] = references.ReferenceCache(ttl=app.config['REFERENCE_CACHE_TTL'])
+    app.extensions['report_cache'] = analytics.ReportCache()
+    app.extensions['chat_limits'] = ratelimit.ChatLimits(
+        store=(ratelimit.SqliteStore(app.config['CHAT_RATE_LIMIT_DB']) if app.config['CHAT_RATE_LIMIT_DB']
+               else ratelimit.MemoryStore()),
+        rate=app.config['CHAT_RATE'],
+        burst=app.config['CHAT_BURST'],
+        max_concurrent=app.config['CHAT_MAX_CONCURRENT']
+    )
+    app.extensions['change_feed'] = changes.ChangeFeed(retain=app.config['CHANGE_LOG_RETAIN'])
+    app.extensions['message_waiters'] = changes.MessageWaiters()
+    app.register_blueprint(api)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(seed.seed_command)
+    return app
+
+
+def sqlite_path():
+    url = db.engine.url
+    return url.database if url.get_backend_name() == 'sqlite' else None
+
+
+def init_db(log=print):
+    """Create any missing database tables."""
+    existed = inspect(db.engine).has_table('project')
+    db.create_all()
+    path = sqlite_path()
+    if path:
+        # Fresh tables already have the latest schema; older ones need migrating
+        if existed:
+            migrate.upgrade_file(path, log=log)
+        else:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('PRAGMA user_version = %d' % migrate.LATEST)
 
 
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create any missing database tables."""
+    init_db(log=click.echo)
+    click.echo('Initialized the database.')
 
 
-# Initialize Flask app
-app = Flask(__name__)
+@click.command('migrate')
+@with_appcontext
+def migrate_command():
+    """Upgrade an existing SQLite database to the current schema."""
+    path = sqlite_path()
+    if not path:
+        raise click.ClickException('Migrations only apply to SQLite databases.')
+    if not migrate.upgrade_file(path, log=click.echo):
+        click.echo('Database is up to date.')
 
-# Configuration
-app.config['SECRET_KEY'] = '385-342-391'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///community.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db.init_app(app)
+def llm_executor():
+    return current_app.extensions['llm_executor']
+
+
+def hash_password(password):
+    return current_app.extensions['hash_executor'].call(
+        passwords.hash_password, password, current_app.config['PASSWORD_HASH_METHOD']
+    )
 
 
-from cba import CBAA
-from models import ChatSession, ChatMessage
+@api.errorhandler(Saturated)
+def saturated(e):
+    response = jsonify({'error': 'The server is busy, please try again shortly', 'retry_after': e.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
-chatbot = CBAA()
 
-# Database Models
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), unique=True, nullable=False)
-    username = db.Column(db.String(50), unique=True, nullable=False)
-    password = db.Column(db.String(100), nullable=False)
+@api.errorhandler(ratelimit.RateLimited)
+def rate_limited(e):
+    metrics.chat_limited.inc(e.reason)
+    response = jsonify({'error': e.message, 'retry_after': e.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
-class Project(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(100), nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(20), default='proposed')
-    budget = db.Column(db.Float, nullable=False)
-    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
-class Contribution(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_username = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    project_title = db.Column(db.String, db.ForeignKey('project.title'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+@api.errorhandler(ExecutorTimeout)
+def executor_timeout(e):
+    # The hash pool times out logins and sign-ups, not the assistant
+    if e.name == 'llm':
+        return jsonify({'error': 'The assistant took too long to answer'}), 504
+    return jsonify({'error': 'The server took too long to respond, please try again'}), 504
 
-class Vote(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_username = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    project_title = db.Column(db.String, db.ForeignKey('project.title'), nullable=False)
-    vote_type = db.Column(db.String(10), nullable=False)
-    comment = db.Column(db.Text, nullable=True)
-    date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
-class Budget(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    mandatory = db.Column(db.Float, default=0)
-    essential = db.Column(db.Float, default=0)
-    discretionary = db.Column(db.Float, default=0)
-    total = db.Column(db.Float, nullable=False)
-    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+@api.errorhandler(InvalidQuery)
+@api.errorhandler(bulk.BulkError)
+def invalid_query(e):
+    return jsonify({'message': str(e)}), 400
 
-class Expense(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    description = db.Column(db.String(100), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    category = db.Column(db.String(20), nullable=False)
-    project_title = db.Column(db.String, db.ForeignKey('project.title'), nullable=True)
-    date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+@api.errorhandler(changes.ChangesCompacted)
+def changes_compacted(e):
+    return jsonify({'message': str(e), 'seq': e.seq}), 410
 
 
+def bulk_response(kind):
+    # 201 when every record went in, 207 when some were rejected (see 'errors')
+    report = bulk.ingest(kind, bulk.read_records())
+    return jsonify(report), 201 if not report['errors'] else 207
+
 
 # Login required decorator
 def login_required(f):
@@ -86,17 +198,50 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/chat/start', methods=['POST'])
+@api.route('/chat/start', methods=['POST'])
+@login_required
+@ratelimit.limit_chat(concurrent=False)
 def start_chat():
+    user_id, _ = references.resolve(username=session['username'])
+    if not user_id:
+        return jsonify({'message': 'User not found'}), 404
     chatbot = CBAA()
-    session_id = chatbot.create_session(user_id=1)  # Default user_id=1 for testing
+    session_id = chatbot.create_session(user_id=user_id)
     return jsonify({'session_id': session_id})
 
 
-@app.route('/chat/message/<int:session_id>', methods=['POST'])
+def next_chat_step(chatbot, session_id, user_message):
+    """Work out how to answer a message: ('end'|'prompt'|'advice'|'reply', payload)."""
+    # Check for termination keywords
+    if user_message.lower() in ['bye', 'exit', 'quit', 'end']:
+        return 'end', None
+
+    # Onboarding progress is the number of bot messages so far: the context, then one per question
+    history = chatbot.get_chat_history(session_id)
+    asked = sum(1 for message in history if not message.is_user)
+
+    if asked < 5:  # Assuming you have a context and 4 project basics
+        if asked == 0:  # Initial request for project description
+            return 'prompt', "What would you like to do for your community? Tell me about your project idea:"
+        elif asked == 1:  # Ask for budget
+            return 'prompt', "Do you have a specific amount of money you can use for this project?"
+        elif asked == 2:  # Ask for timeline
+            return 'prompt', "When would you like to do this project? For example: next month, over the summer, etc."
+        elif asked == 3:  # Ask for helpers
+            return 'prompt', "Who will help you with this project? For example: friends, neighbors, volunteers, etc."
+        else:
+            # All basics have been collected: the user's earlier answers plus this one
+            answers = [message.content for message in history if message.is_user][:3] + [user_message]
+            return 'advice', dict(zip(('description', 'budget', 'timeline', 'helpers'), answers))
+
+    # If basics are collected, process the user message
+    return 'reply', None
+
+
+@api.route('/chat/message/<int:session_id>', methods=['POST'])
+@ratelimit.limit_chat()
 def send_message(session_id):
-    chatbot = CBAA()
-    chatbot.current_session_id = session_id  # Attach to the current session
+    chatbot = CBAA(session_id)
 
     # Get user message
     data = request.get_json(force=True)
@@ -105,76 +250,237 @@ def send_message(session_id):
     if not user_message:
         return jsonify({'error': 'Message cannot be empty'}), 400
 
-    # Check for termination keywords
-    if user_message.lower() in ['bye', 'exit', 'quit', 'end']:
+    step, payload = next_chat_step(chatbot, session_id, user_message)
+
+    if step == 'end':
         chatbot.end_session()
         return jsonify({'message': 'Chat ended successfully'})
 
-    # Ensure project basics have been collected
-    history = chatbot.get_chat_history(session_id)
+    if step == 'prompt':
+        # Store the user's answer and the chatbot's next question in chat history
+        chatbot.store_message(user_message)
+        chatbot.store_message(payload, is_user=False)
+        chatbot.flush()
+        return jsonify({'response': payload})
+
+    if step == 'advice':
+        # Get budgeting advice based on collected info
+        chatbot.store_message(user_message)
+        budget_advice = llm_executor().call_in_app_context(
+            chatbot.get_budget_advice, payload, use_cache=request.args.get('nocache') != '1'
+        )
+        response = jsonify({'response': budget_advice})
+        response.headers['X-Advice-Cache'] = 'hit' if chatbot.advice_cached else 'miss'
+        return response
+
+    response = llm_executor().call_in_app_context(chatbot.get_response, user_message)
+    return jsonify({'response': response})
 
-    if len(history) < 5:  # Assuming you have a context and 4 project basics
-        if len(history) == 0:  # Initial request for project description
-            prompt = "What would you like to do for your community? Tell me about your project idea:"
-        elif len(history) == 1:  # Ask for budget
-            prompt = "Do you have a specific amount of money you can use for this project?"
-        elif len(history) == 2:  # Ask for timeline
-            prompt = "When would you like to do this project? For example: next month, over the summer, etc."
-        elif len(history) == 3:  # Ask for helpers
-            prompt = "Who will help you with this project? For example: friends, neighbors, volunteers, etc."
-        else:
-            # All basics have been collected
-            project_info = {
-                'description': history[0].content,
-                'budget': history[1].content,
-                'timeline': history[2].content,
-                'helpers': history[3].content
-            }
-            # Get budgeting advice based on collected info
-            budget_advice = chatbot.get_budget_advice(project_info)
-            return jsonify({'response': budget_advice})
 
-        # Store the chatbot's prompt in chat history
-        chatbot.store_message(prompt, is_user=False)
-        return jsonify({'response': prompt})
+def sse(data, event=None):
+    message = 'data: %s\n\n' % json.dumps(data)
+    if event:
+        message = 'event: %s\n%s' % (event, message)
+    return message
 
-    # If basics are collected, process the user message
-    response = chatbot.get_response(user_message)
-    return jsonify({'response': response})
+
+@api.route('/chat/message/<int:session_id>/stream', methods=['POST'])
+@ratelimit.limit_chat()
+def stream_message(session_id):
+    """Same flow as send_message, but model output is sent as Server-Sent Events."""
+    chatbot = CBAA(session_id)
+
+    data = request.get_json(force=True)
+    user_message = data.get('message', '').strip()
+
+    if not user_message:
+        return jsonify({'error': 'Message cannot be empty'}), 400
+
+    step, payload = next_chat_step(chatbot, session_id, user_message)
+
+    if step == 'end':
+        chatbot.end_session()
+        return jsonify({'message': 'Chat ended successfully'})
+
+    if step in ('prompt', 'advice'):
+        chatbot.store_message(user_message)
+    if step == 'prompt':
+        chatbot.store_message(payload, is_user=False)
+        chatbot.flush()
+        chunks = iter([payload])
+        slot = None
+    else:
+        # The stream is read on this request thread, but still takes an LLM slot until it closes
+        executor = llm_executor()
+        slot = executor.acquire()
+        try:
+            if step == 'advice':
+                chunks = chatbot.stream_budget_advice(payload, use_cache=request.args.get('nocache') != '1')
+            else:
+                chunks = chatbot.stream_response(user_message)
+        except Exception:
+            # A cache hit writes to the database here, before call_on_close can release the slot
+            executor.release(slot)
+            raise
+
+    def generate():
+        response = []
+        for chunk in chunks:
+            response.append(chunk)
+            yield sse({'delta': chunk})
+        yield sse({'response': ''.join(response)}, event='done')
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    if step == 'advice':
+        response.headers['X-Advice-Cache'] = 'hit' if chatbot.advice_cached else 'miss'
+    if slot is not None:
+        response.call_on_close(lambda: executor.release(slot))
+    return response
 
 
-@app.route('/chat/message2/<int:session_id>', methods=['POST'])
+@api.route('/chat/message2/<int:session_id>', methods=['POST'])
+@ratelimit.limit_chat()
 def send_message2(session_id):
     data = request.get_json(force=True)
-    chatbot = CBAA()
-    chatbot.current_session_id = session_id
-    response = chatbot.get_response(data.get('message', ''))
+    chatbot = CBAA(session_id)
+    response = llm_executor().call_in_app_context(chatbot.get_response, data.get('message', ''))
     return jsonify({'response': response})
 
-@app.route('/chat/history/<int:session_id>', methods=['GET'])
+@api.route('/chat/history/<int:session_id>', methods=['GET'])
 def get_history(session_id):
-    chatbot = CBAA()
-    messages = chatbot.get_chat_history(session_id)
-    return jsonify([{
-        'content': msg.content,
-        'is_user': msg.is_user,
-        'timestamp': str(msg.timestamp)
-    } for msg in messages])
-
-@app.route('/chat/end/<int:session_id>', methods=['POST']) 
+    since = parse_int('since_message_id')
+    if since is None:
+        messages = serializers.rows(ChatMessage).filter(
+            ChatMessage.session_id == session_id).order_by(ChatMessage.id).all()
+        return jsonify(serializers.to_list(ChatMessage, messages))
+
+    # Delta mode: only newer messages, as [id, is_user, content] rows, optionally waiting for one
+    max_wait = current_app.config['CHANGES_MAX_WAIT']
+    wait = parse_int('wait', default=0, maximum=max_wait)
+    query = db.session.query(ChatMessage.id, ChatMessage.is_user, ChatMessage.content).filter(
+        ChatMessage.session_id == session_id, ChatMessage.id > since).order_by(ChatMessage.id)
+    waiters = changes.message_waiters()
+    seen = waiters.watch(session_id)
+    try:
+        deadline = time.monotonic() + wait
+        while True:
+            messages = query.all()
+            remaining = deadline - time.monotonic()
+            if messages or remaining <= 0:
+                break
+            db.session.close()
+            seen = waiters.wait(session_id, seen, min(remaining, waiters.poll_interval))
+    finally:
+        waiters.unwatch(session_id)
+    return jsonify({
+        'fields': ['id', 'is_user', 'content'],
+        'messages': [list(message) for message in messages],
+        'last_id': messages[-1][0] if messages else since
+    })
+
+@api.route('/chat/end/<int:session_id>', methods=['POST']) 
 def end_chat(session_id):
-    chatbot = CBAA()
-    chatbot.current_session_id = session_id
+    chatbot = CBAA(session_id)
     chatbot.end_session()
     return jsonify({'message': 'Cheers'})
 
-@app.route("/")
+@api.route('/chat/pool', methods=['GET'])
+def chat_pool_stats():
+    return jsonify(chat_pool.stats())
+
+@api.route('/chat/advice-cache', methods=['GET'])
+def advice_cache_stats():
+    return jsonify(advice_cache.stats())
+
+@api.route('/report-cache', methods=['GET'])
+def report_cache_stats():
+    return jsonify(current_app.extensions['report_cache'].stats())
+
+@api.route('/chat/waiters', methods=['GET'])
+def chat_waiters_stats():
+    return jsonify(changes.message_waiters().stats())
+
+@api.route('/chat/limits', methods=['GET'])
+def chat_limits_stats():
+    return jsonify(current_app.extensions['chat_limits'].stats())
+
+@api.route('/chat/executor', methods=['GET'])
+def chat_executor_stats():
+    return jsonify(llm_executor().stats())
+
+@api.route('/search', methods=['GET'])
+def search_all():
+    q = request.args.get('q', '').strip()
+    if not q:
+        raise InvalidQuery('q is required')
+    if not search.available():
+        return jsonify({'message': 'Search needs the SQLite database'}), 501
+    types = request.args.get('type')
+    types = types.split(',') if types else search.TYPES
+    unknown = set(types) - set(search.TYPES)
+    if unknown:
+        raise InvalidQuery('type must be one of: %s' % ', '.join(search.TYPES))
+    limit = parse_int('limit', default=20, minimum=1, maximum=100)
+    offset = parse_int('offset', default=0)
+
+    # Chat messages are only searched for their owner
+    user_id = references.resolve(username=session['username'])[0] if 'username' in session else None
+    results, more = search.search(q, types, limit, offset, user_id=user_id, context=CONTEXT)
+    response = jsonify(results)
+    if more:
+        args = request.args.to_dict()
+        args['offset'] = offset + limit
+        response.headers['Link'] = '<%s?%s>; rel="next"' % (request.base_url, urlencode(args))
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return response
+
+@api.route('/changes', methods=['GET'])
+def get_changes():
+    if not changes.available():
+        return jsonify({'message': 'The change feed needs the SQLite database'}), 501
+    # Without since, just the current seq: fetch the lists after reading it, then poll from it
+    since = parse_int('since')
+    if since is None:
+        return jsonify({'changes': [], 'seq': changes.latest()})
+    tables = request.args.get('tables')
+    tables = tables.split(',') if tables else None
+    if tables and set(tables) - set(changes.MODELS):
+        raise InvalidQuery('tables must be some of: %s' % ', '.join(changes.MODELS))
+    limit = parse_int('limit', default=500, minimum=1, maximum=1000)
+    max_wait = current_app.config['CHANGES_MAX_WAIT']
+    wait = parse_int('wait', default=max_wait, maximum=max_wait)
+
+    feed = changes.feed()
+    deadline = time.monotonic() + wait
+    while True:
+        seen = feed.commits
+        found, seq = changes.read(since, tables, limit)
+        remaining = deadline - time.monotonic()
+        if found or remaining <= 0:
+            break
+        # Release the connection (and SQLite's read snapshot) while blocked
+        db.session.close()
+        feed.wait(seen, min(remaining, feed.poll_interval))
+    return jsonify({'changes': found, 'seq': seq})
+
+@api.route('/changes/stats', methods=['GET'])
+def change_feed_stats():
+    return jsonify(changes.feed().stats())
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route("/")
 def index():
     return "MAIN PAGE"
 
 
 # Authentication routes
-@app.route('/auth/login', methods=['POST'])
+@api.route('/auth/login', methods=['POST'])
 def login():
     data = request.get_json()
     
@@ -186,7 +492,16 @@ def login():
     if not user:
         return jsonify({'message': 'User not found'}), 401
         
-    if check_password_hash(user.password, data['password']):
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    matches, needs_rehash = current_app.extensions['hash_executor'].call(
+        passwords.verify, user.password, data['password'], method
+    )
+    if matches:
+        if needs_rehash:
+            # Upgrade hashes made with older parameters while we have the password
+            user.password = hash_password(data['password'])
+            versions.bump('user')
+            db.session.commit()
         session['username'] = user.username
         return jsonify({
             'message': 'Login successful',
@@ -198,22 +513,25 @@ def login():
     
     return jsonify({'message': 'Invalid password'}), 401
 
-@app.route('/auth/logout', methods=['GET'])
+@api.route('/auth/logout', methods=['GET'])
 def logout():
     session.pop('username', None)
     return jsonify({'message': 'Logged out successfully'})
 
 
-@app.route('/user', methods=['POST'])
+@api.route('/user', methods=['POST'])
 def create_user():
     data = request.get_json()
     
-    if User.query.filter_by(username=data['username']).first():
+    taken = db.session.query(User.username, User.name).filter(
+        or_(User.username == data['username'], User.name == data['name'])
+    ).limit(2).all()
+    if any(username == data['username'] for username, _ in taken):
         return jsonify({'message': 'Username already exists'}), 400
-    if User.query.filter_by(name=data['name']).first():
+    if taken:
         return jsonify({'message': 'Name already exists'}), 400
     
-    hashed_password = generate_password_hash(data['password'], method='sha256')
+    hashed_password = hash_password(data['password'])
     new_user = User(
         name=data['name'],
         username=data['username'],
@@ -222,24 +540,28 @@ def create_user():
     
     try:
         db.session.add(new_user)
+        versions.bump('user')
         db.session.commit()
         return jsonify({'message': 'User created successfully'}), 201
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/user', methods=['GET'])
+@api.route('/user', methods=['GET'])
+@versions.conditional('user')
 def get_users():
-    users = User.query.all()
-    return jsonify([{'id': user.id, 'name': user.name, 'username': user.username} for user in users])
+    users, next_after_id = keyset_page(serializers.rows(User), User)
+    response = jsonify(serializers.to_list(User, users))
+    return add_page_headers(response, next_after_id)
 
-@app.route('/user/<username>', methods=['GET'])
+@api.route('/user/<username>', methods=['GET'])
+@versions.conditional('user')
 def get_user(username):
-    user = User.query.filter_by(username=username).first()
+    user = serializers.first(User, User.username == username)
     if not user:
         return jsonify({'message': 'User not found'}), 404
-    return jsonify({'id': user.id, 'name': user.name, 'username': user.username})
+    return jsonify(user)
 
-@app.route('/user/<username>', methods=['PUT'])
+@api.route('/user/<username>', methods=['PUT'])
 def update_user(username):
     user = User.query.filter_by(username=username).first()
     if not user:
@@ -249,15 +571,17 @@ def update_user(username):
     if 'name' in data:
         user.name = data['name']
     if 'password' in data:
-        user.password = generate_password_hash(data['password'], method='sha256')
+        user.password = hash_password(data['password'])
     
     try:
+        references.invalidate_user(username)
+        versions.bump('user')
         db.session.commit()
         return jsonify({'message': 'User updated successfully'})
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/user/<username>', methods=['DELETE'])
+@api.route('/user/<username>', methods=['DELETE'])
 def delete_user(username):
     user = User.query.filter_by(username=username).first()
     if not user:
@@ -265,6 +589,8 @@ def delete_user(username):
     
     try:
         db.session.delete(user)
+        references.invalidate_user(username)
+        versions.bump('user')
         db.session.commit()
         return jsonify({'message': 'User deleted successfully'})
     except Exception as e:
@@ -272,11 +598,12 @@ def delete_user(username):
 
 
 # Project CRUD Operations
-@app.route('/project', methods=['POST'])
+@api.route('/project', methods=['POST'])
 def create_project():
     data = request.get_json()
     
-    if not User.query.filter_by(username=data['created_by']).first():
+    user_id, _ = references.resolve(username=data['created_by'])
+    if not user_id:
         return jsonify({'message': 'User not found'}), 404
     
     new_project = Project(
@@ -288,40 +615,78 @@ def create_project():
     
     try:
         db.session.add(new_project)
+        db.session.flush()
+        db.session.add(ProjectStats(project_id=new_project.id))
+        changes.record('project', 'insert', new_project.id)
         db.session.commit()
         return jsonify({'message': 'Project created successfully'}), 201
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/project', methods=['GET'])
+PROJECT_FILTERS = [
+    ('status', Project.status, 'eq'),
+    ('created_by', Project.created_by, 'eq'),
+    ('since', Project.created_at, 'since'),
+    ('until', Project.created_at, 'until')
+]
+
+@api.route('/project', methods=['GET'])
+@versions.conditional('project')
 def get_projects():
-    projects = Project.query.all()
-    return jsonify([{
-        'id': project.id,
-        'title': project.title,
-        'description': project.description,
-        'status': project.status,
-        'budget': project.budget,
-        'created_by': project.created_by,
-        'created_at': project.created_at
-    } for project in projects])
-
-@app.route('/project/<title>', methods=['GET'])
+    projects, next_after_id = keyset_page(serializers.rows(Project), Project, PROJECT_FILTERS)
+    response = jsonify(serializers.to_list(Project, projects))
+    return add_page_headers(response, next_after_id)
+
+@api.route('/project/export', methods=['GET'])
+def export_projects():
+    return export_response('projects', serializers.columns(Project), PROJECT_FILTERS)
+
+@api.route('/project/stats', methods=['GET'])
+@versions.conditional('project', 'vote', 'contribution')
+def get_projects_stats():
+    titles = request.args.get('titles')
+    if titles:
+        rows = stats.stats_query().filter(Project.title.in_(titles.split(','))).all()
+        return jsonify([stats.to_dict(project, counters) for project, counters in rows])
+
+    rows, next_after_id = keyset_page(stats.stats_query(), Project, [
+        ('status', Project.status, 'eq')
+    ], row_id=lambda row: row[0].id)
+    response = jsonify([stats.to_dict(project, counters) for project, counters in rows])
+    return add_page_headers(response, next_after_id)
+
+@api.route('/project/<title>/stats', methods=['GET'])
+@versions.conditional('project', 'vote', 'contribution')
+def get_project_stats(title):
+    row = stats.stats_query().filter(Project.title == title).first()
+    if not row:
+        return jsonify({'message': 'Project not found'}), 404
+    return jsonify(stats.to_dict(*row))
+
+@api.route('/project/<title>/spend', methods=['GET'])
+@versions.conditional('project', 'expense')
+def get_project_spend(title):
+    def build():
+        project = Project.query.filter_by(title=title).first()
+        if not project:
+            return None
+        return analytics.project_spend(
+            project, request.args.get('period', 'week'), parse_datetime('since'), parse_datetime('until'))
+
+    report = cached_report(['project', 'expense'], build)
+    if report is None:
+        return jsonify({'message': 'Project not found'}), 404
+    return jsonify(report)
+
+@api.route('/project/<title>', methods=['GET'])
+@versions.conditional('project')
 def get_project(title):
-    project = Project.query.filter_by(title=title).first()
+    project = serializers.first(Project, Project.title == title)
     if not project:
         return jsonify({'message': 'Project not found'}), 404
-    return jsonify({
-        'id': project.id,
-        'title': project.title,
-        'description': project.description,
-        'status': project.status,
-        'budget': project.budget,
-        'created_by': project.created_by,
-        'created_at': project.created_at
-    })
+    return jsonify(project)
 
-@app.route('/project/<title>', methods=['PUT'])
+@api.route('/project/<title>', methods=['PUT'])
 def update_project(title):
     project = Project.query.filter_by(title=title).first()
     if not project:
@@ -336,153 +701,189 @@ def update_project(title):
         project.budget = data['budget']
     
     try:
+        references.invalidate_project(title)
+        changes.record('project', 'update', project.id)
         db.session.commit()
         return jsonify({'message': 'Project updated successfully'})
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/project/<title>', methods=['DELETE'])
+@api.route('/project/<title>', methods=['DELETE'])
 def delete_project(title):
     project = Project.query.filter_by(title=title).first()
     if not project:
         return jsonify({'message': 'Project not found'}), 404
     
     try:
+        # Votes, contributions and expenses are kept, detached from the project
+        for model, table in ((Vote, 'vote'), (Contribution, 'contribution'), (Expense, 'expense')):
+            ids = db.session.execute(update(model).where(model.project_id == project.id).values(
+                project_id=None).returning(model.id)).scalars().all()
+            changes.record(table, 'update', *ids)
+        ProjectStats.query.filter_by(project_id=project.id).delete()
         db.session.delete(project)
+        references.invalidate_project(title)
+        changes.record('project', 'delete', project.id)
         db.session.commit()
         return jsonify({'message': 'Project deleted successfully'})
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
 # Contribution CRUD Operations
-@app.route('/contribution', methods=['POST'])
+@api.route('/contribution', methods=['POST'])
 def create_contribution():
     data = request.get_json()
     
     # Validate user and project exist
-    if not User.query.filter_by(username=data['user_username']).first():
+    user_id, project_id = references.resolve(data['user_username'], data['project_title'])
+    if not user_id:
         return jsonify({'message': 'User not found'}), 404
-    if not Project.query.filter_by(title=data['project_title']).first():
+    if not project_id:
         return jsonify({'message': 'Project not found'}), 404
     
     new_contribution = Contribution(
         user_username=data['user_username'],
         project_title=data['project_title'],
+        project_id=project_id,
         amount=data['amount']
     )
     
     try:
         db.session.add(new_contribution)
+        db.session.flush()
+        stats.adjust(project_id, **stats.contribution_deltas(new_contribution.amount))
+        changes.record('contribution', 'insert', new_contribution.id)
         db.session.commit()
         return jsonify({'message': 'Contribution created successfully'}), 201
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/contribution', methods=['GET'])
+@api.route('/contribution/bulk', methods=['POST'])
+def create_contributions_bulk():
+    return bulk_response('contribution')
+
+CONTRIBUTION_FILTERS = [
+    ('project_title', Contribution.project_title, 'eq'),
+    ('user_username', Contribution.user_username, 'eq'),
+    ('since', Contribution.date, 'since'),
+    ('until', Contribution.date, 'until')
+]
+
+@api.route('/contribution', methods=['GET'])
+@versions.conditional('contribution')
 def get_contributions():
-    contributions = Contribution.query.all()
-    return jsonify([{
-        'id': contribution.id,
-        'user_username': contribution.user_username,
-        'project_title': contribution.project_title,
-        'amount': contribution.amount,
-        'date': contribution.date
-    } for contribution in contributions])
-
-@app.route('/contribution/<int:id>', methods=['GET'])
+    contributions, next_after_id = keyset_page(serializers.rows(Contribution), Contribution, CONTRIBUTION_FILTERS)
+    response = jsonify(serializers.to_list(Contribution, contributions))
+    return add_page_headers(response, next_after_id)
+
+@api.route('/contribution/export', methods=['GET'])
+def export_contributions():
+    return export_response('contributions', serializers.columns(Contribution), CONTRIBUTION_FILTERS)
+
+@api.route('/contribution/<int:id>', methods=['GET'])
+@versions.conditional('contribution')
 def get_contribution(id):
-    contribution = Contribution.query.get(id)
+    contribution = serializers.first(Contribution, Contribution.id == id)
     if not contribution:
         return jsonify({'message': 'Contribution not found'}), 404
-    return jsonify({
-        'id': contribution.id,
-        'user_username': contribution.user_username,
-        'project_title': contribution.project_title,
-        'amount': contribution.amount,
-        'date': contribution.date
-    })
+    return jsonify(contribution)
 
-@app.route('/contribution/<int:id>', methods=['PUT'])
+@api.route('/contribution/<int:id>', methods=['PUT'])
 def update_contribution(id):
     contribution = Contribution.query.get(id)
     if not contribution:
         return jsonify({'message': 'Contribution not found'}), 404
     
     data = request.get_json()
-    if 'amount' in data:
-        contribution.amount = data['amount']
     
     try:
+        if 'amount' in data:
+            amount = float(data['amount'])
+            stats.adjust(contribution.project_id, contributed=amount - contribution.amount)
+            contribution.amount = amount
+        changes.record('contribution', 'update', id)
         db.session.commit()
         return jsonify({'message': 'Contribution updated successfully'})
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/contribution/<int:id>', methods=['DELETE'])
+@api.route('/contribution/<int:id>', methods=['DELETE'])
 def delete_contribution(id):
     contribution = Contribution.query.get(id)
     if not contribution:
         return jsonify({'message': 'Contribution not found'}), 404
     
     try:
+        stats.adjust(contribution.project_id, **stats.contribution_deltas(contribution.amount, -1))
         db.session.delete(contribution)
+        changes.record('contribution', 'delete', id)
         db.session.commit()
         return jsonify({'message': 'Contribution deleted successfully'})
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
 # Vote CRUD Operations
-@app.route('/vote', methods=['POST'])
+@api.route('/vote', methods=['POST'])
 def create_vote():
     data = request.get_json()
     
     # Validate user and project exist
-    if not User.query.filter_by(username=data['user_username']).first():
+    user_id, project_id = references.resolve(data['user_username'], data['project_title'])
+    if not user_id:
         return jsonify({'message': 'User not found'}), 404
-    if not Project.query.filter_by(title=data['project_title']).first():
+    if not project_id:
         return jsonify({'message': 'Project not found'}), 404
     
     new_vote = Vote(
         user_username=data['user_username'],
         project_title=data['project_title'],
+        project_id=project_id,
         vote_type=data['vote_type'],
         comment=data.get('comment')
     )
     
     try:
         db.session.add(new_vote)
+        db.session.flush()
+        stats.adjust(project_id, **stats.vote_deltas(new_vote.vote_type))
+        changes.record('vote', 'insert', new_vote.id)
         db.session.commit()
         return jsonify({'message': 'Vote created successfully'}), 201
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/vote', methods=['GET'])
+@api.route('/vote/bulk', methods=['POST'])
+def create_votes_bulk():
+    return bulk_response('vote')
+
+VOTE_FILTERS = [
+    ('project_title', Vote.project_title, 'eq'),
+    ('user_username', Vote.user_username, 'eq'),
+    ('vote_type', Vote.vote_type, 'eq'),
+    ('since', Vote.date, 'since'),
+    ('until', Vote.date, 'until')
+]
+
+@api.route('/vote', methods=['GET'])
+@versions.conditional('vote')
 def get_votes():
-    votes = Vote.query.all()
-    return jsonify([{
-        'id': vote.id,
-        'user_username': vote.user_username,
-        'project_title': vote.project_title,
-        'vote_type': vote.vote_type,
-        'comment': vote.comment,
-        'date': vote.date
-    } for vote in votes])
-
-@app.route('/vote/<int:id>', methods=['GET'])
+    votes, next_after_id = keyset_page(serializers.rows(Vote), Vote, VOTE_FILTERS)
+    response = jsonify(serializers.to_list(Vote, votes))
+    return add_page_headers(response, next_after_id)
+
+@api.route('/vote/export', methods=['GET'])
+def export_votes():
+    return export_response('votes', serializers.columns(Vote), VOTE_FILTERS)
+
+@api.route('/vote/<int:id>', methods=['GET'])
+@versions.conditional('vote')
 def get_vote(id):
-    vote = Vote.query.get(id)
+    vote = serializers.first(Vote, Vote.id == id)
     if not vote:
         return jsonify({'message': 'Vote not found'}), 404
-    return jsonify({
-        'id': vote.id,
-        'user_username': vote.user_username,
-        'project_title': vote.project_title,
-        'vote_type': vote.vote_type,
-        'comment': vote.comment,
-        'date': vote.date
-    })
+    return jsonify(vote)
 
-@app.route('/vote/<int:id>', methods=['PUT'])
+@api.route('/vote/<int:id>', methods=['PUT'])
 def update_vote(id):
     vote = Vote.query.get(id)
     if not vote:
@@ -490,36 +891,42 @@ def update_vote(id):
     
     data = request.get_json()
     if 'vote_type' in data:
+        if data['vote_type'] != vote.vote_type:
+            stats.adjust(vote.project_id, **stats.vote_change_deltas(vote.vote_type, data['vote_type']))
         vote.vote_type = data['vote_type']
     if 'comment' in data:
         vote.comment = data['comment']
     
     try:
+        changes.record('vote', 'update', vote.id)
         db.session.commit()
         return jsonify({'message': 'Vote updated successfully'})
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/vote/<int:id>', methods=['DELETE'])
+@api.route('/vote/<int:id>', methods=['DELETE'])
 def delete_vote(id):
     vote = Vote.query.get(id)
     if not vote:
         return jsonify({'message': 'Vote not found'}), 404
     
     try:
+        stats.adjust(vote.project_id, **stats.vote_deltas(vote.vote_type, -1))
         db.session.delete(vote)
+        changes.record('vote', 'delete', id)
         db.session.commit()
         return jsonify({'message': 'Vote deleted successfully'})
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
 # Budget CRUD Operations
-@app.route('/budget', methods=['POST'])
+@api.route('/budget', methods=['POST'])
 def create_budget():
     data = request.get_json()
     
     # Validate user exists
-    if not User.query.filter_by(username=data['created_by']).first():
+    user_id, _ = references.resolve(username=data['created_by'])
+    if not user_id:
         return jsonify({'message': 'User not found'}), 404
     
     total = data.get('mandatory', 0) + data.get('essential', 0) + data.get('discretionary', 0)
@@ -535,42 +942,67 @@ def create_budget():
     
     try:
         db.session.add(new_budget)
+        db.session.flush()
+        changes.record('budget', 'insert', new_budget.id)
         db.session.commit()
         return jsonify({'message': 'Budget created successfully'}), 201
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/budget', methods=['GET'])
+BUDGET_FILTERS = [
+    ('created_by', Budget.created_by, 'eq'),
+    ('since', Budget.created_at, 'since'),
+    ('until', Budget.created_at, 'until')
+]
+
+@api.route('/budget', methods=['GET'])
+@versions.conditional('budget')
 def get_budgets():
-    budgets = Budget.query.all()
-    return jsonify([{
-        'id': budget.id,
-        'name': budget.name,
-        'mandatory': budget.mandatory,
-        'essential': budget.essential,
-        'discretionary': budget.discretionary,
-        'total': budget.total,
-        'created_by': budget.created_by,
-        'created_at': budget.created_at
-    } for budget in budgets])
-
-@app.route('/budget/<int:id>', methods=['GET'])
+    budgets, next_after_id = keyset_page(serializers.rows(Budget), Budget, BUDGET_FILTERS)
+    response = jsonify(serializers.to_list(Budget, budgets))
+    return add_page_headers(response, next_after_id)
+
+@api.route('/budget/export', methods=['GET'])
+def export_budgets():
+    return export_response('budgets', serializers.columns(Budget), BUDGET_FILTERS)
+
+@api.route('/budget/<int:id>', methods=['GET'])
+@versions.conditional('budget')
 def get_budget(id):
-    budget = Budget.query.get(id)
+    budget = serializers.first(Budget, Budget.id == id)
     if not budget:
         return jsonify({'message': 'Budget not found'}), 404
-    return jsonify({
-        'id': budget.id,
-        'name': budget.name,
-        'mandatory': budget.mandatory,
-        'essential': budget.essential,
-        'discretionary': budget.discretionary,
-        'total': budget.total,
-        'created_by': budget.created_by,
-        'created_at': budget.created_at
-    })
+    return jsonify(budget)
+
+def cached_report(tables, build):
+    """Return build()'s report, reused until one of tables changes."""
+    found, _ = versions.current(tables)
+    stamp = tuple(sorted(found.items()))
+    key = (request.path, request.query_string)
+    cache = current_app.extensions['report_cache']
+    report = cache.get(key, stamp)
+    if report is None:
+        report = build()
+        if report is not None:
+            cache.set(key, stamp, report)
+    return report
+
+@api.route('/budget/<int:id>/report', methods=['GET'])
+@versions.conditional('budget', 'expense')
+def get_budget_report(id):
+    def build():
+        budget = Budget.query.get(id)
+        if not budget:
+            return None
+        return analytics.budget_report(
+            budget, request.args.get('period', 'week'), parse_datetime('since'), parse_datetime('until'))
+
+    report = cached_report(['budget', 'expense'], build)
+    if report is None:
+        return jsonify({'message': 'Budget not found'}), 404
+    return jsonify(report)
 
-@app.route('/budget/<int:id>', methods=['PUT'])
+@api.route('/budget/<int:id>', methods=['PUT'])
 def update_budget(id):
     budget = Budget.query.get(id)
     if not budget:
@@ -587,12 +1019,13 @@ def update_budget(id):
         budget.total = budget.mandatory + budget.essential + budget.discretionary
     
     try:
+        changes.record('budget', 'update', id)
         db.session.commit()
         return jsonify({'message': 'Budget updated successfully'})
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
-@app.route('/budget/<int:id>', methods=['DELETE'])
+@api.route('/budget/<int:id>', methods=['DELETE'])
 def delete_budget(id):
     budget = Budget.query.get(id)
     if not budget:
@@ -600,6 +1033,7 @@ def delete_budget(id):
     
     try:
         db.session.delete(budget)
+        changes.record('budget', 'delete', id)
         db.session.commit()
         return jsonify({'message': 'Budget deleted successfully'})
     except Exception as e:
@@ -608,7 +1042,10 @@ def delete_budget(id):
 
 
 #Expense CRUD Operations
-@app.route('/expense', methods=['POST'])
+def project_id_for(title):
+   return references.resolve(title=title)[1]
+
+@api.route('/expense', methods=['POST'])
 def create_expense():
    data = request.get_json()
    new_expense = Expense(
@@ -616,59 +1053,69 @@ def create_expense():
        amount=float(data['amount']),
        category=data['category'],
        project_title=data.get('project_title'),
+       project_id=project_id_for(data.get('project_title')),
        created_by=data['created_by']
    )
    db.session.add(new_expense)
+   db.session.flush()
+   changes.record('expense', 'insert', new_expense.id)
    db.session.commit()
    return jsonify({'message': 'Expense created successfully'}), 201
 
-@app.route('/expense', methods=['GET'])
+@api.route('/expense/bulk', methods=['POST'])
+def create_expenses_bulk():
+   return bulk_response('expense')
+
+EXPENSE_FILTERS = [
+    ('project_title', Expense.project_title, 'eq'),
+    ('category', Expense.category, 'eq'),
+    ('created_by', Expense.created_by, 'eq'),
+    ('since', Expense.date, 'since'),
+    ('until', Expense.date, 'until')
+]
+
+@api.route('/expense', methods=['GET'])
+@versions.conditional('expense')
 def get_expenses():
-   expenses = Expense.query.all()
-   return jsonify([{
-       'id': e.id,
-       'description': e.description,
-       'amount': e.amount,
-       'category': e.category,
-       'project_title': e.project_title,
-       'created_by': e.created_by,
-       'date': e.date
-   } for e in expenses])
-
-
-@app.route('/expense/<int:id>', methods=['GET'])
+   expenses, next_after_id = keyset_page(serializers.rows(Expense), Expense, EXPENSE_FILTERS)
+   response = jsonify(serializers.to_list(Expense, expenses))
+   return add_page_headers(response, next_after_id)
+
+
+@api.route('/expense/export', methods=['GET'])
+def export_expenses():
+   return export_response('expenses', serializers.columns(Expense), EXPENSE_FILTERS)
+
+@api.route('/expense/<int:id>', methods=['GET'])
+@versions.conditional('expense')
 def get_expense(id):
-   expense = Expense.query.get(id)
-   return jsonify({
-       'id': expense.id,
-       'description': expense.description,
-       'amount': expense.amount,
-       'category': expense.category,
-       'project_title': expense.project_title,
-       'created_by': expense.created_by,
-       'date': expense.date.isoformat()
-   })
-
-@app.route('/expense/<int:id>', methods=['PUT'])
+   expense = serializers.first(Expense, Expense.id == id)
+   if not expense:
+       return jsonify({'message': 'Expense not found'}), 404
+   return jsonify(expense)
+
+@api.route('/expense/<int:id>', methods=['PUT'])
 def update_expense(id):
    expense = Expense.query.get(id)
    data = request.get_json()
    if 'description' in data: expense.description = data['description']
    if 'amount' in data: expense.amount = float(data['amount'])
    if 'category' in data: expense.category = data['category']
-   if 'project_title' in data: expense.project_title = data['project_title']
+   if 'project_title' in data:
+       expense.project_title = data['project_title']
+       expense.project_id = project_id_for(data['project_title'])
+   changes.record('expense', 'update', id)
    db.session.commit()
    return jsonify({'message': 'Expense updated successfully'})
 
-@app.route('/expense/<int:id>', methods=['DELETE'])
+@api.route('/expense/<int:id>', methods=['DELETE'])
 def delete_expense(id):
    expense = Expense.query.get(id)
    db.session.delete(expense)
+   changes.record('expense', 'delete', id)
    db.session.commit()
    return jsonify({'message': 'Expense deleted successfully'})
 
-# Create database tables
-with app.app_context():
-    db.create_all()
 
-app.run(debug=True)
+if __name__ == '__main__':
+    create_app().run(debug=True)
@@ -0,0 +1,194 @@
+"""Load test for the chat endpoints against the offline fake LLM backend.
+
+Each simulated user logs in, calls POST /chat/start and walks the
+send_message onboarding flow: four answers, the budget advice (an LLM
+call, or an advice cache hit) and --followups more replies (LLM calls).
+All users run at once. Users share --ideas distinct sets of answers, so
+advice is reported as two steps: 'advice' for cache misses and
+'advice cached' for hits (from the X-Advice-Cache header). Per-step
+latency percentiles and overall requests/sec are reported.
+
+The run fails if there are more cache hits than users sharing an idea
+could produce, i.e. if different answers were served the same advice.
+Use --max-p95 to also exit non-zero when a regression pushes the LLM-step
+p95 over a threshold, e.g. in CI.
+
+    python benchmarks/chat_load.py [--users 32] [--ideas 16] [--followups 2] [--latency lognormal:0.2:0.5]
+                                   [--stream] [--failure-rate 0.05] [--json out.json] [--max-p95 2.0]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter('ignore')
+
+from app import create_app  # noqa: E402
+from models import db, User  # noqa: E402
+import cba  # noqa: E402
+from advice_cache import advice_cache  # noqa: E402
+import llm  # noqa: E402
+import passwords  # noqa: E402
+
+HASH_METHOD = 'pbkdf2:sha256:1000'
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def simulate(app, n, args, record):
+    client = app.test_client()
+    username = 'load%d' % n
+
+    def timed(step, method, url, **kwargs):
+        start = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        response.get_data()
+        # Closing runs call_on_close, which gives back a streamed reply's LLM slot and concurrency count
+        response.close()
+        record(step, time.perf_counter() - start, response.status_code)
+        return response
+
+    timed('login', 'post', '/auth/login', json={'username': username, 'password': 'load'})
+    response = timed('start', 'post', '/chat/start')
+    if response.status_code != 200:
+        return
+    session_id = response.get_json()['session_id']
+    url = '/chat/message/%d%s' % (session_id, '/stream' if args.stream else '')
+
+    idea = n % args.ideas
+    answers = [
+        'A reading corner in the community centre, idea %d' % idea,
+        'About %d pounds' % (100 + idea),
+        'Over the summer',
+        'Friends and neighbours',
+    ]
+    for answer in answers[:-1]:
+        timed('onboarding', 'post', url, json={'message': answer})
+    # The last answer completes onboarding and triggers the budget advice call
+    start = time.perf_counter()
+    response = client.post(url, json={'message': answers[-1]})
+    response.get_data()
+    response.close()
+    cached = response.headers.get('X-Advice-Cache') == 'hit'
+    record('advice cached' if cached else 'advice', time.perf_counter() - start, response.status_code)
+    for _ in range(args.followups):
+        timed('reply', 'post', url, json={'message': 'How should we raise the money?'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--ideas', type=int, help='distinct sets of onboarding answers (default: users / 2)')
+    parser.add_argument('--followups', type=int, default=2)
+    parser.add_argument('--latency', default='lognormal:0.2:0.5', help='fake time-to-first-token distribution')
+    parser.add_argument('--chunk-delay', type=float, default=0.005)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=16, help='LLM executor threads')
+    parser.add_argument('--stream', action='store_true', help='use the SSE endpoint')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--max-p95', type=float, help='fail when the advice/reply p95 exceeds this many seconds')
+    args = parser.parse_args()
+    args.ideas = max(1, min(args.ideas or args.users // 2, args.users))
+
+    # Only this run's answers may hit: no persistent tier, nothing left from an earlier run
+    advice_cache.persistent = None
+    advice_cache.clear()
+    hits_before = advice_cache.hits
+    cba.use_backend(llm.FakeBackend(latency=args.latency, chunk_delay=args.chunk_delay,
+                                    failure_rate=args.failure_rate, seed=args.seed))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'load.db'),
+            'PASSWORD_HASH_METHOD': HASH_METHOD,
+            'LLM_WORKERS': args.workers,
+            'LLM_QUEUE': args.users * 2,
+            # Measuring the chat path, not the limiter
+            'CHAT_RATE': 1000.0,
+            'CHAT_BURST': 1000,
+            'CHAT_MAX_CONCURRENT': 10,
+        })
+        with app.app_context():
+            db.create_all()
+            stored = passwords.hash_password('load', HASH_METHOD)
+            db.session.add_all([User(name='Load %d' % n, username='load%d' % n, password=stored)
+                                for n in range(args.users)])
+            db.session.commit()
+
+        samples = {}
+        statuses = {}
+        lock = threading.Lock()
+
+        def record(step, seconds, status):
+            with lock:
+                samples.setdefault(step, []).append(seconds)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        threads = [threading.Thread(target=simulate, args=(app, n, args, record)) for n in range(args.users)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        with app.app_context():
+            db.engine.dispose()
+
+    total = sum(len(values) for values in samples.values())
+    results = {
+        'users': args.users,
+        'ideas': args.ideas,
+        'advice_cache_hits': advice_cache.hits - hits_before,
+        'stream': args.stream,
+        'latency': args.latency,
+        'elapsed': round(elapsed, 3),
+        'requests': total,
+        'requests_per_sec': round(total / elapsed, 1),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'steps': {}
+    }
+    print('%d users, %d requests in %.2fs: %.1f req/s, statuses %s' % (
+        args.users, total, elapsed, total / elapsed, results['statuses']))
+    print('%-14s %7s %9s %9s %9s %9s' % ('step', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms'))
+    for step in ('login', 'start', 'onboarding', 'advice', 'advice cached', 'reply'):
+        values = samples.get(step, [])
+        if not values:
+            continue
+        row = {'count': len(values)}
+        for pct in (50, 95, 99):
+            row['p%d' % pct] = round(percentile(values, pct), 4)
+        row['max'] = round(max(values), 4)
+        results['steps'][step] = row
+        print('%-14s %7d %9.1f %9.1f %9.1f %9.1f' % (
+            step, row['count'], row['p50'] * 1000, row['p95'] * 1000, row['p99'] * 1000, row['max'] * 1000))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    # Users with the same idea can share advice; anything beyond that means the cache key ignores the answers
+    if results['advice_cache_hits'] > args.users - args.ideas:
+        sys.exit('%d advice cache hits for %d users with %d distinct ideas: different answers shared advice' % (
+            results['advice_cache_hits'], args.users, args.ideas))
+
+    if args.max_p95 is not None:
+        llm_steps = samples.get('advice', []) + samples.get('reply', [])
+        p95 = percentile(llm_steps, 95)
+        if p95 is not None and p95 > args.max_p95:
+            sys.exit('LLM step p95 %.3fs is over --max-p95 %.3fs' % (p95, args.max_p95))
+
+
+if __name__ == '__main__':
+    main()
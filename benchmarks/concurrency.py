@@ -0,0 +1,113 @@
+"""Mixed read/write throughput with and without the SQLite tuning pragmas.
+
+Runs reader threads paging through GET /vote and writer threads posting
+votes and chat-sized message commits, against a file database. The run is
+repeated with the default rollback journal (no pragmas) and with
+database.SQLITE_PRAGMAS, and ops/sec and lock errors are reported for both.
+
+    python benchmarks/concurrency.py [--readers 8] [--writers 4] [--seconds 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter('ignore')
+
+from app import create_app  # noqa: E402
+from models import db, User, Project, Vote, ChatSession, ChatMessage  # noqa: E402
+import database  # noqa: E402
+
+
+def setup(app, votes=20000):
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(name='Bench', username='bench', password='x'))
+        db.session.add(Project(title='Bench', description='x', budget=100, created_by='bench'))
+        db.session.add(ChatSession(user_id=1, status='active'))
+        db.session.flush()
+        db.session.execute(db.insert(Vote), [
+            {'user_username': 'bench', 'project_title': 'Bench', 'project_id': 1, 'vote_type': 'up'}
+            for _ in range(votes)
+        ])
+        db.session.commit()
+
+
+def run(pragmas, readers, writers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+            'SQLITE_PRAGMAS': pragmas,
+        })
+        setup(app)
+
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        stop = time.perf_counter() + seconds
+
+        def bump(key):
+            with lock:
+                counts[key] += 1
+
+        def reader():
+            client = app.test_client()
+            after = 0
+            while time.perf_counter() < stop:
+                response = client.get('/vote?limit=100&after_id=%d' % after)
+                if response.status_code == 200:
+                    bump('reads')
+                    after = int(response.headers.get('X-Next-After-Id') or 0)
+                else:
+                    bump('errors')
+
+        def writer(n):
+            client = app.test_client()
+            while time.perf_counter() < stop:
+                if n % 2:
+                    response = client.post('/vote', json={
+                        'user_username': 'bench', 'project_title': 'Bench', 'vote_type': 'up'})
+                    bump('writes' if response.status_code == 201 else 'errors')
+                    continue
+                # Same shape of write as CBAA.flush(): two messages in one commit
+                try:
+                    with app.app_context():
+                        db.session.add_all([
+                            ChatMessage(session_id=1, is_user=True, content='question ' * 20),
+                            ChatMessage(session_id=1, is_user=False, content='answer ' * 200)
+                        ])
+                        db.session.commit()
+                    bump('writes')
+                except Exception:
+                    bump('errors')
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with app.app_context():
+            db.engine.dispose()
+        return {key: value / float(seconds) if key != 'errors' else value for key, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print('%-16s %12s %12s %8s' % ('mode', 'reads/s', 'writes/s', 'errors'))
+    for label, pragmas in (('rollback journal', {}), ('tuned (WAL)', database.SQLITE_PRAGMAS)):
+        result = run(pragmas, args.readers, args.writers, args.seconds)
+        print('%-16s %12.1f %12.1f %8d' % (label, result['reads'], result['writes'], result['errors']))
+
+
+if __name__ == '__main__':
+    main()
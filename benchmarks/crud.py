@@ -0,0 +1,294 @@
+"""Latency, SQL statement counts and peak memory for every route at scale.
+
+Seeds a throwaway SQLite database with seed.py (--scale multiplies
+seed.DEFAULTS, so --scale 10 is 1M votes), or uses --database as-is, then
+calls every route through the Flask test client, chat on the fake LLM
+backend with no latency. Each route is timed over --iterations calls. One more call runs under tracemalloc for its peak
+Python memory. Results are written to a JSON file; pass an earlier file
+as --compare to print the change per route.
+
+    python benchmarks/crud.py [--scale 1] [--iterations 20] [--only vote] [--compare old.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter('ignore')
+
+from sqlalchemy import event, func  # noqa: E402
+
+from app import create_app, init_db  # noqa: E402
+from models import db, Project, User, Vote, Contribution, Budget, Expense  # noqa: E402
+import cba  # noqa: E402
+import llm  # noqa: E402
+import seed  # noqa: E402
+
+HASH_METHOD = 'pbkdf2:sha256:1000'
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def cases(ctx):
+    """(name, method, url, json body or None, headers) factories, called with the iteration number."""
+    hot, cold, user = quote(ctx['hot_title'], safe=''), quote(ctx['cold_title'], safe=''), ctx['username']
+    deep = max(ctx['max_ids']['vote'] - 100, 0)
+    titles = ','.join(quote(title, safe='') for title in ctx['doomed_titles'])
+    chat = ctx['chat_sessions']
+    # Newest seeded rows first, one per DELETE call; the DELETE cases run last
+    deletable = {table: iter(range(max_id, 0, -1)) for table, max_id in ctx['max_ids'].items()}
+    doomed_titles, doomed_users, ending = iter(ctx['doomed_titles']), iter(ctx['doomed_users']), iter(chat[3:])
+    vote = {'user_username': user, 'project_title': ctx['hot_title'], 'vote_type': 'up'}
+    contribution = {'user_username': user, 'project_title': ctx['hot_title'], 'amount': 10}
+    expense = {'description': 'Paint', 'amount': 12.5, 'category': 'materials', 'project_title': ctx['hot_title'],
+               'created_by': user}
+    return [
+        ('GET /', 'get', lambda n: '/', None, None),
+        ('GET /user', 'get', lambda n: '/user', None, None),
+        ('GET /user/<username>', 'get', lambda n: '/user/%s' % user, None, None),
+        ('GET /project', 'get', lambda n: '/project', None, None),
+        ('GET /project?status', 'get', lambda n: '/project?status=approved&limit=200', None, None),
+        ('GET /project/<title>', 'get', lambda n: '/project/%s' % cold, None, None),
+        ('GET /project/export', 'get', lambda n: '/project/export', None, None),
+        ('GET /project/stats', 'get', lambda n: '/project/stats?limit=200', None, None),
+        ('GET /project/stats?titles', 'get', lambda n: '/project/stats?titles=%s' % titles, None, None),
+        ('GET /project/<title>/stats', 'get', lambda n: '/project/%s/stats' % hot, None, None),
+        ('GET /project/<title>/spend', 'get', lambda n: '/project/%s/spend?period=month&n=%d' % (hot, n), None, None),
+        ('GET /contribution', 'get', lambda n: '/contribution', None, None),
+        ('GET /contribution?project', 'get', lambda n: '/contribution?project_title=%s&limit=500' % hot, None, None),
+        ('GET /contribution/<id>', 'get', lambda n: '/contribution/1', None, None),
+        ('GET /contribution/export', 'get', lambda n: '/contribution/export', None, None),
+        ('GET /vote', 'get', lambda n: '/vote', None, None),
+        ('GET /vote?limit=500', 'get', lambda n: '/vote?limit=500', None, None),
+        ('GET /vote deep page', 'get', lambda n: '/vote?limit=100&after_id=%d' % deep, None, None),
+        ('GET /vote?project', 'get', lambda n: '/vote?project_title=%s&limit=500' % hot, None, None),
+        ('GET /vote (304)', 'get', lambda n: '/vote', None, lambda: {'If-None-Match': ctx['vote_etag']}),
+        ('GET /vote/<id>', 'get', lambda n: '/vote/1', None, None),
+        ('GET /vote/export', 'get', lambda n: '/vote/export', None, None),
+        ('GET /budget', 'get', lambda n: '/budget', None, None),
+        ('GET /budget/<id>', 'get', lambda n: '/budget/1', None, None),
+        ('GET /budget/<id>/report', 'get', lambda n: '/budget/1/report?n=%d' % n, None, None),
+        ('GET /budget/export', 'get', lambda n: '/budget/export', None, None),
+        ('GET /expense', 'get', lambda n: '/expense', None, None),
+        ('GET /expense?category', 'get', lambda n: '/expense?category=food&limit=500', None, None),
+        ('GET /expense/<id>', 'get', lambda n: '/expense/1', None, None),
+        ('GET /expense/export', 'get', lambda n: '/expense/export', None, None),
+        ('GET /search?q=garden', 'get', lambda n: '/search?q=garden', None, None),
+        ('GET /search rare term', 'get', lambda n: '/search?q=bigger&type=vote&offset=%d' % (n % 5 * 20), None, None),
+        ('GET /search prefix', 'get', lambda n: '/search?q=volun&type=vote', None, None),
+        ('POST /auth/login', 'post', lambda n: '/auth/login', lambda n: {'username': user, 'password': 'password'}, None),
+        ('POST /user', 'post', lambda n: '/user',
+         lambda n: {'name': 'Bench %d' % n, 'username': 'bench%d' % n, 'password': 'password'}, None),
+        ('PUT /user/<username>', 'put', lambda n: '/user/%s' % user, lambda n: {'name': 'Bench %d' % n}, None),
+        ('POST /project', 'post', lambda n: '/project', lambda n: {
+            'title': 'Bench project %d' % n, 'description': 'x', 'budget': 500, 'created_by': user}, None),
+        ('PUT /project/<title>', 'put', lambda n: '/project/%s' % cold, lambda n: {'budget': 1000 + n}, None),
+        ('POST /vote', 'post', lambda n: '/vote', lambda n: vote, None),
+        ('PUT /vote/<id>', 'put', lambda n: '/vote/1', lambda n: {'vote_type': 'down' if n % 2 else 'up'}, None),
+        ('POST /vote/bulk (1000)', 'post', lambda n: '/vote/bulk', lambda n: [vote] * 1000, None),
+        ('POST /contribution', 'post', lambda n: '/contribution', lambda n: contribution, None),
+        ('PUT /contribution/<id>', 'put', lambda n: '/contribution/1', lambda n: {'amount': 10 + n % 7}, None),
+        ('POST /contribution/bulk (1000)', 'post', lambda n: '/contribution/bulk', lambda n: [contribution] * 1000,
+         None),
+        ('POST /budget', 'post', lambda n: '/budget', lambda n: {
+            'name': 'Bench', 'mandatory': 100, 'essential': 50, 'discretionary': 10, 'created_by': user}, None),
+        ('PUT /budget/<id>', 'put', lambda n: '/budget/1', lambda n: {'mandatory': 100 + n % 7}, None),
+        ('POST /expense', 'post', lambda n: '/expense', lambda n: expense, None),
+        ('PUT /expense/<id>', 'put', lambda n: '/expense/1', lambda n: {'amount': 12.5 + n % 7}, None),
+        ('POST /expense/bulk (1000)', 'post', lambda n: '/expense/bulk', lambda n: [expense] * 1000, None),
+        # The writes above have filled the feed
+        ('GET /changes', 'get', lambda n: '/changes', None, None),
+        ('GET /changes?since', 'get', lambda n: '/changes?since=%d&wait=0' % ctx['seq'], None, None),
+        ('GET /changes?tables', 'get', lambda n: '/changes?since=%d&tables=vote&wait=0' % ctx['seq'], None, None),
+        # Chat on the fake backend with no latency, so only the app's own time is measured
+        ('POST /chat/start', 'post', lambda n: '/chat/start', None, None),
+        ('POST /chat/message', 'post', lambda n: '/chat/message/%d' % chat[0], lambda n: {'message': 'Idea %d' % n},
+         None),
+        ('POST /chat/message/stream', 'post', lambda n: '/chat/message/%d/stream' % chat[1],
+         lambda n: {'message': 'Idea %d' % n}, None),
+        ('POST /chat/message2', 'post', lambda n: '/chat/message2/%d' % chat[2], lambda n: {'message': 'Help %d' % n},
+         None),
+        ('GET /chat/history/<id>', 'get', lambda n: '/chat/history/%d' % chat[0], None, None),
+        ('GET /chat/history?since', 'get', lambda n: '/chat/history/%d?since_message_id=%d&wait=0' % (chat[0], n),
+         None, None),
+        ('POST /chat/end/<id>', 'post', lambda n: '/chat/end/%d' % next(ending), None, None),
+        ('GET /chat/pool', 'get', lambda n: '/chat/pool', None, None),
+        ('GET /chat/advice-cache', 'get', lambda n: '/chat/advice-cache', None, None),
+        ('GET /chat/waiters', 'get', lambda n: '/chat/waiters', None, None),
+        ('GET /chat/limits', 'get', lambda n: '/chat/limits', None, None),
+        ('GET /chat/executor', 'get', lambda n: '/chat/executor', None, None),
+        ('GET /report-cache', 'get', lambda n: '/report-cache', None, None),
+        ('GET /changes/stats', 'get', lambda n: '/changes/stats', None, None),
+        ('GET /metrics', 'get', lambda n: '/metrics', None, None),
+        ('DELETE /vote/<id>', 'delete', lambda n: '/vote/%d' % next(deletable['vote']), None, None),
+        ('DELETE /contribution/<id>', 'delete', lambda n: '/contribution/%d' % next(deletable['contribution']),
+         None, None),
+        ('DELETE /budget/<id>', 'delete', lambda n: '/budget/%d' % next(deletable['budget']), None, None),
+        ('DELETE /expense/<id>', 'delete', lambda n: '/expense/%d' % next(deletable['expense']), None, None),
+        ('DELETE /project/<title>', 'delete', lambda n: '/project/%s' % quote(next(doomed_titles), safe=''),
+         None, None),
+        ('DELETE /user/<username>', 'delete', lambda n: '/user/%s' % next(doomed_users), None, None),
+        ('GET /auth/logout', 'get', lambda n: '/auth/logout', None, None),
+    ]
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def after_cursor_execute(self, *args):
+        self.count += 1
+
+
+def run_case(client, counter, case, iterations, offset):
+    name, method, url, body, headers = case
+    call = getattr(client, method)
+
+    def once(n):
+        response = call(url(n), json=body(n) if body else None, headers=headers() if headers else None)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    times = []
+    statements = []
+    statuses = {}
+    for n in range(offset, offset + iterations):
+        before = counter.count
+        start = time.perf_counter()
+        status = once(n)
+        times.append(time.perf_counter() - start)
+        statements.append(counter.count - before)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    tracemalloc.start()
+    once(offset + iterations)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times.sort()
+    return {
+        'iterations': iterations,
+        'p50_ms': round(statistics.median(times) * 1000, 3),
+        'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 3),
+        'max_ms': round(times[-1] * 1000, 3),
+        'sql_statements': round(statistics.mean(statements), 1),
+        'peak_kb': round(peak / 1024.0, 1),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())}
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    with open(path) as f:
+        previous = json.load(f)['routes']
+    print('\n%-30s %12s %12s %8s' % ('route', 'p50 before', 'p50 now', 'change'))
+    for name, row in results.items():
+        old = previous.get(name)
+        if not old or not old['p50_ms']:
+            continue
+        change = 100.0 * (row['p50_ms'] - old['p50_ms']) / old['p50_ms']
+        print('%-30s %12.2f %12.2f %+7.0f%%' % (name, old['p50_ms'], row['p50_ms'], change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for seed.DEFAULTS')
+    parser.add_argument('--database', help='benchmark this (already seeded) SQLite file instead; it is written to')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--only', help='only routes whose name contains this')
+    parser.add_argument('--out', help='results file (default: benchmarks/results/crud-<time>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    path = args.database or os.path.join(tmp.name, 'bench.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(path),
+        'PASSWORD_HASH_METHOD': HASH_METHOD,
+        # Time the chat routes, not the chat limits
+        'CHAT_RATE': 1e6,
+        'CHAT_BURST': 1000000,
+        'CHAT_MAX_CONCURRENT': 1000,
+    })
+    cba.use_backend(llm.FakeBackend(latency='fixed:0', chunk_delay=0, seed=1))
+    counts = {name: int(value * args.scale) for name, value in seed.DEFAULTS.items()}
+    with app.app_context():
+        init_db(log=lambda message: None)
+        if not args.database:
+            start = time.perf_counter()
+            seed.seed(password='password', log=lambda message: None, **counts)
+            print('seeded %s in %.1fs' % (', '.join('%d %s' % (v, k) for k, v in counts.items()),
+                                          time.perf_counter() - start))
+        username = db.session.query(Project.created_by).order_by(Project.id).first()[0]
+        # One row per DELETE call, plus the one under tracemalloc
+        doomed = args.iterations + 1
+        ctx = {
+            'hot_title': db.session.query(Project.title).order_by(Project.id).first()[0],
+            'cold_title': db.session.query(Project.title).order_by(Project.id.desc()).first()[0],
+            'username': username,
+            'max_ids': {model.__tablename__: db.session.query(func.max(model.id)).scalar() or 0
+                        for model in (Vote, Contribution, Budget, Expense)},
+            'doomed_titles': [title for (title,) in db.session.query(Project.title).order_by(
+                Project.id.desc()).limit(doomed)],
+            'doomed_users': [name for (name,) in db.session.query(User.username).filter(
+                User.username != username).order_by(User.id.desc()).limit(doomed)],
+        }
+        counter = StatementCounter(db.engine)
+
+    client = app.test_client()
+    ctx['vote_etag'] = client.get('/vote').headers.get('ETag', '')
+    ctx['seq'] = client.get('/changes').get_json()['seq']
+    # The chat routes need a login: three sessions to message, the rest for /chat/end
+    client.post('/auth/login', json={'username': ctx['username'], 'password': 'password'})
+    ctx['chat_sessions'] = [client.post('/chat/start').get_json()['session_id'] for _ in range(3 + doomed)]
+
+    results = {}
+    print('%-30s %9s %9s %9s %6s %10s  %s' % ('route', 'p50 ms', 'p95 ms', 'max ms', 'sql', 'peak KB', 'statuses'))
+    for case in cases(ctx):
+        if args.only and args.only not in case[0]:
+            continue
+        iterations = max(2, args.iterations // 10) if 'export' in case[0] or 'bulk' in case[0] else args.iterations
+        row = run_case(client, counter, case, iterations, offset=len(results) * 1000)
+        results[case[0]] = row
+        print('%-30s %9.2f %9.2f %9.2f %6.1f %10.1f  %s' % (
+            case[0], row['p50_ms'], row['p95_ms'], row['max_ms'], row['sql_statements'], row['peak_kb'], row['statuses']))
+
+    with app.app_context():
+        db.engine.dispose()
+    tmp.cleanup()
+
+    out = args.out or os.path.join(RESULTS_DIR, 'crud-%s.json' % datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': sys.version.split()[0],
+            'database': 'given' if args.database else counts,
+            'iterations': args.iterations,
+            'routes': results
+        }, f, indent=2)
+    print('\nwrote %s' % out)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Logins per second per core for password hashing parameters.
+
+For each method, times passwords.verify() on one thread (logins/sec/core)
+and then pushes a burst of POST /auth/login requests through the app with
+several client threads. This shows whole-route throughput and how many
+requests the bounded hash executor rejected with 429.
+
+    python benchmarks/logins.py [--methods scrypt:32768:8:1,pbkdf2:sha256:600000] [--burst 64]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter('ignore')
+
+from app import create_app  # noqa: E402
+from models import db, User  # noqa: E402
+import passwords  # noqa: E402
+
+
+def per_core(method, seconds=2.0):
+    stored = passwords.hash_password('correct horse', method)
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        passwords.verify(stored, 'correct horse', method)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def burst(method, requests, clients):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+            'PASSWORD_HASH_METHOD': method,
+        })
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(name='Bench', username='bench',
+                                password=passwords.hash_password('correct horse', method)))
+            db.session.commit()
+
+        statuses = {}
+        lock = threading.Lock()
+        per_client = requests // clients
+
+        def client():
+            test_client = app.test_client()
+            for _ in range(per_client):
+                status = test_client.post('/auth/login', json={
+                    'username': 'bench', 'password': 'correct horse'}).status_code
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        with app.app_context():
+            db.engine.dispose()
+        return statuses.get(200, 0) / elapsed, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', default='scrypt:32768:8:1,scrypt:16384:8:1,pbkdf2:sha256:600000')
+    parser.add_argument('--burst', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=16)
+    args = parser.parse_args()
+
+    print('cores: %d' % (os.cpu_count() or 1))
+    print('%-24s %16s %16s  %s' % ('method', 'logins/s/core', 'route logins/s', 'statuses'))
+    for method in args.methods.split(','):
+        rate = per_core(method)
+        route_rate, statuses = burst(method, args.burst, args.clients)
+        print('%-24s %16.1f %16.1f  %s' % (method, rate, route_rate, statuses))
+
+
+if __name__ == '__main__':
+    main()
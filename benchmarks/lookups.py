@@ -0,0 +1,115 @@
+"""Per-project lookup latency before and after migration 1 (keys and indexes).
+
+Builds a throwaway SQLite database with the pre-migration schema, fills
+it with synthetic projects, votes, contributions and expenses, and times
+the lookups the API does. It then runs migrate.upgrade() on the same file
+and times them again.
+
+    python benchmarks/lookups.py [--projects 2000] [--rows 200000] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrate  # noqa: E402
+
+# Schema as shipped before migration 1, as found in community.db
+LEGACY_SCHEMA = """
+CREATE TABLE user (id INTEGER NOT NULL, name VARCHAR(50) NOT NULL, username VARCHAR(50) NOT NULL,
+    password VARCHAR(100) NOT NULL, PRIMARY KEY (id), UNIQUE (name), UNIQUE (username));
+CREATE TABLE project (id INTEGER NOT NULL, title VARCHAR(100) NOT NULL, description TEXT NOT NULL,
+    status VARCHAR(20), budget FLOAT NOT NULL, created_by VARCHAR NOT NULL, created_at DATETIME,
+    PRIMARY KEY (id));
+CREATE TABLE vote (id INTEGER NOT NULL, user_username VARCHAR NOT NULL, project_title VARCHAR NOT NULL,
+    vote_type VARCHAR(10) NOT NULL, comment TEXT, date DATETIME, PRIMARY KEY (id));
+CREATE TABLE contribution (id INTEGER NOT NULL, user_username VARCHAR NOT NULL,
+    project_title VARCHAR NOT NULL, amount FLOAT NOT NULL, date DATETIME, PRIMARY KEY (id));
+CREATE TABLE expense (id INTEGER NOT NULL, description VARCHAR(100) NOT NULL, amount FLOAT NOT NULL,
+    category VARCHAR(20) NOT NULL, project_title VARCHAR, date DATETIME, created_by VARCHAR NOT NULL,
+    PRIMARY KEY (id));
+"""
+
+QUERIES = {
+    'project by title': ('SELECT id FROM project WHERE title = ?', 'title'),
+    'votes for project': ("SELECT vote_type, COUNT(*) FROM vote WHERE project_title = ? GROUP BY vote_type", 'title'),
+    'contribution total': ('SELECT SUM(amount) FROM contribution WHERE project_title = ?', 'title'),
+    'expenses for project': ('SELECT SUM(amount) FROM expense WHERE project_title = ?', 'title'),
+    'votes by user': ('SELECT COUNT(*) FROM vote WHERE user_username = ?', 'user'),
+}
+
+AFTER_ONLY = {
+    'votes for project_id': ("SELECT vote_type, COUNT(*) FROM vote WHERE project_id = ? GROUP BY vote_type", 'id'),
+}
+
+
+def populate(conn, projects, rows, users=1000):
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany('INSERT INTO user (id, name, username, password) VALUES (?, ?, ?, ?)',
+                     [(i, 'User %d' % i, 'user%d' % i, 'x') for i in range(1, users + 1)])
+    conn.executemany(
+        "INSERT INTO project (id, title, description, status, budget, created_by) VALUES (?, ?, '', 'proposed', 1000, 'user1')",
+        [(i, 'Project %d' % i) for i in range(1, projects + 1)])
+
+    def ref():
+        return 'user%d' % random.randint(1, users), 'Project %d' % random.randint(1, projects)
+
+    conn.executemany("INSERT INTO vote (user_username, project_title, vote_type) VALUES (?, ?, ?)",
+                     [ref() + (random.choice(['up', 'down']),) for _ in range(rows)])
+    conn.executemany('INSERT INTO contribution (user_username, project_title, amount) VALUES (?, ?, ?)',
+                     [ref() + (random.uniform(1, 100),) for _ in range(rows // 2)])
+    conn.executemany("INSERT INTO expense (description, amount, category, project_title, created_by) VALUES ('x', ?, 'essential', ?, 'user1')",
+                     [(random.uniform(1, 100), ref()[1]) for _ in range(rows // 2)])
+    conn.commit()
+
+
+def time_queries(conn, queries, projects, repeat, users=1000):
+    results = {}
+    for name, (sql, kind) in queries.items():
+        samples = []
+        for _ in range(repeat):
+            i = random.randint(1, projects)
+            arg = {'title': 'Project %d' % i, 'id': i, 'user': 'user%d' % random.randint(1, users)}[kind]
+            t0 = time.perf_counter()
+            conn.execute(sql, (arg,)).fetchall()
+            samples.append((time.perf_counter() - t0) * 1000)
+        results[name] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--projects', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(path)
+        print('populating %d projects, %d votes...' % (args.projects, args.rows))
+        populate(conn, args.projects, args.rows)
+        before = time_queries(conn, QUERIES, args.projects, args.repeat)
+
+        t0 = time.perf_counter()
+        migrate.upgrade(conn, log=lambda msg: None)
+        print('migration took %.2f s' % (time.perf_counter() - t0))
+        after = time_queries(conn, dict(QUERIES, **AFTER_ONLY), args.projects, args.repeat)
+        conn.close()
+
+    print('\n%-24s %12s %12s %9s' % ('query (median)', 'before ms', 'after ms', 'speedup'))
+    for name in after:
+        if name in before:
+            print('%-24s %12.3f %12.3f %8.0fx' % (name, before[name], after[name], before[name] / after[name]))
+        else:
+            print('%-24s %12s %12.3f' % (name, '-', after[name]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Time building and encoding large list payloads.
+
+Loads --rows votes and serializes them three ways: ORM objects turned into
+dicts by hand and encoded with the stdlib provider (the old route code),
+column tuples through serializers.to_list with the stdlib provider, and
+column tuples with the orjson provider (when orjson is installed).
+
+    python benchmarks/serialization.py [--rows 100000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter('ignore')
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, User, Project, Vote  # noqa: E402
+import serializers  # noqa: E402
+
+
+def setup(app, rows):
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(name='Bench', username='bench', password='x'))
+        db.session.add(Project(title='Bench', description='x', budget=100, created_by='bench'))
+        db.session.flush()
+        db.session.execute(db.insert(Vote), [
+            {'user_username': 'bench', 'project_title': 'Bench', 'project_id': 1,
+             'vote_type': 'up', 'comment': 'looks good %d' % n}
+            for n in range(rows)
+        ])
+        db.session.commit()
+
+
+def orm_dicts():
+    return [{
+        'id': vote.id,
+        'user_username': vote.user_username,
+        'project_title': vote.project_title,
+        'vote_type': vote.vote_type,
+        'comment': vote.comment,
+        'date': vote.date.isoformat()
+    } for vote in Vote.query.order_by(Vote.id).all()]
+
+
+def column_dicts():
+    return serializers.to_list(Vote, serializers.rows(Vote).order_by(Vote.id).all())
+
+
+def best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db')})
+        setup(app, args.rows)
+        providers = [('stdlib', DefaultJSONProvider(app))]
+        if serializers.orjson is not None:
+            providers.append(('orjson', serializers.ORJSONProvider(app)))
+
+        print('%-20s %-8s %10s %10s %10s %12s' % ('rows from', 'encoder', 'build ms', 'encode ms', 'total ms', 'bytes'))
+        with app.app_context():
+            for label, build in (('ORM objects', orm_dicts), ('column tuples', column_dicts)):
+                build_time, payload = best(build, args.repeat)
+                for name, provider in providers:
+                    if label == 'ORM objects' and name != 'stdlib':
+                        continue
+                    encode_time, body = best(lambda: provider.dumps(payload), args.repeat)
+                    print('%-20s %-8s %10.1f %10.1f %10.1f %12d' % (
+                        label, name, build_time * 1000, encode_time * 1000,
+                        (build_time + encode_time) * 1000, len(body)))
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
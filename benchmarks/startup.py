@@ -0,0 +1,73 @@
+"""Measure cold-start cost of importing app.py and building the app.
+
+Each run happens in a fresh interpreter with outbound network access
+blocked and recorded, so any connection attempt during import or
+create_app() shows up in the report and fails the run.
+
+    python benchmarks/startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, socket, sys, time
+
+attempts = []
+
+def _blocked(kind):
+    def inner(*args, **kwargs):
+        attempts.append('%s %r' % (kind, args[1:] if kind == 'connect' else args[:1]))
+        raise OSError('outbound network blocked by startup benchmark')
+    return inner
+
+socket.socket.connect = _blocked('connect')
+socket.create_connection = _blocked('create_connection')
+socket.getaddrinfo = _blocked('getaddrinfo')
+
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+
+print(json.dumps({'import': t1 - t0, 'create_app': t2 - t1, 'outbound': attempts}))
+'''
+
+
+def run_once():
+    out = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', PROBE],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    outbound = sorted({a for r in results for a in r['outbound']})
+
+    for key in ('import', 'create_app'):
+        samples = [r[key] * 1000 for r in results]
+        print('%-10s median %7.1f ms  min %7.1f ms  max %7.1f ms' % (
+            key, statistics.median(samples), min(samples), max(samples)))
+
+    if outbound:
+        print('outbound calls during startup:')
+        for attempt in outbound:
+            print('  ' + attempt)
+        sys.exit(1)
+    print('outbound calls during startup: none')
+
+
+if __name__ == '__main__':
+    main()
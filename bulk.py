@@ -0,0 +1,191 @@
+import json
+
+from flask import request
+from sqlalchemy import insert
+
+from models import db, User, Project, Vote, Contribution, Expense
+import changes
+import stats
+
+CHUNK_SIZE = 1000
+MAX_ROWS = 100000
+
+
+class BulkError(ValueError):
+    """The request body as a whole couldn't be read."""
+
+
+def read_records():
+    """Records from a JSON array body or an NDJSON (one object per line) body."""
+    too_many = BulkError('At most %d records per request' % MAX_ROWS)
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        # Read the body a line at a time, so an oversized upload is rejected without reading the rest
+        records = []
+        for line_no, line in enumerate(request.stream, 1):
+            if not line.strip():
+                continue
+            if len(records) == MAX_ROWS:
+                raise too_many
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                raise BulkError('Line %d is not valid JSON: %s' % (line_no, e))
+        return records
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        raise BulkError('Expected a JSON array or an application/x-ndjson body')
+    if len(records) > MAX_ROWS:
+        raise too_many
+    return records
+
+
+def existing_usernames(names):
+    names = {name for name in names if isinstance(name, str)}
+    found = set()
+    for chunk in chunks(sorted(names)):
+        found.update(username for (username,) in db.session.query(User.username).filter(User.username.in_(chunk)))
+    return found
+
+
+def project_ids(titles):
+    titles = {title for title in titles if isinstance(title, str)}
+    found = {}
+    for chunk in chunks(sorted(titles)):
+        found.update(db.session.query(Project.title, Project.id).filter(Project.title.in_(chunk)))
+    return found
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def require(record, fields):
+    if not isinstance(record, dict):
+        return 'Record must be an object'
+    missing = [field for field in fields if record.get(field) in (None, '')]
+    if missing:
+        return 'Missing %s' % ', '.join(missing)
+    return None
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def validate_votes(records):
+    users = existing_usernames(r.get('user_username') for r in records if isinstance(r, dict))
+    projects = project_ids(r.get('project_title') for r in records if isinstance(r, dict))
+    rows, errors = [], []
+    for index, record in enumerate(records):
+        error = require(record, ('user_username', 'project_title', 'vote_type'))
+        if not error and record['user_username'] not in users:
+            error = 'User not found'
+        if not error and record['project_title'] not in projects:
+            error = 'Project not found'
+        if error:
+            errors.append({'index': index, 'error': error})
+            continue
+        rows.append({
+            'user_username': record['user_username'],
+            'project_title': record['project_title'],
+            'project_id': projects[record['project_title']],
+            'vote_type': record['vote_type'],
+            'comment': record.get('comment')
+        })
+    return rows, errors
+
+
+def validate_contributions(records):
+    users = existing_usernames(r.get('user_username') for r in records if isinstance(r, dict))
+    projects = project_ids(r.get('project_title') for r in records if isinstance(r, dict))
+    rows, errors = [], []
+    for index, record in enumerate(records):
+        error = require(record, ('user_username', 'project_title', 'amount'))
+        if not error and number(record['amount']) is None:
+            error = 'amount must be a number'
+        if not error and record['user_username'] not in users:
+            error = 'User not found'
+        if not error and record['project_title'] not in projects:
+            error = 'Project not found'
+        if error:
+            errors.append({'index': index, 'error': error})
+            continue
+        rows.append({
+            'user_username': record['user_username'],
+            'project_title': record['project_title'],
+            'project_id': projects[record['project_title']],
+            'amount': number(record['amount'])
+        })
+    return rows, errors
+
+
+def validate_expenses(records):
+    projects = project_ids(r.get('project_title') for r in records if isinstance(r, dict))
+    rows, errors = [], []
+    for index, record in enumerate(records):
+        error = require(record, ('description', 'amount', 'category', 'created_by'))
+        if not error and number(record['amount']) is None:
+            error = 'amount must be a number'
+        if not error and record.get('project_title') and record['project_title'] not in projects:
+            error = 'Project not found'
+        if error:
+            errors.append({'index': index, 'error': error})
+            continue
+        rows.append({
+            'description': record['description'],
+            'amount': number(record['amount']),
+            'category': record['category'],
+            'project_title': record.get('project_title'),
+            'project_id': projects.get(record.get('project_title')),
+            'created_by': record['created_by']
+        })
+    return rows, errors
+
+
+def counter_totals(rows, deltas_for):
+    """Sum per-row counter deltas into one adjustment per project."""
+    totals = {}
+    for row in rows:
+        project = totals.setdefault(row['project_id'], {})
+        for name, delta in deltas_for(row).items():
+            project[name] = project.get(name, 0) + delta
+    return totals
+
+
+KINDS = {
+    'vote': (Vote, validate_votes, lambda row: stats.vote_deltas(row['vote_type'])),
+    'contribution': (Contribution, validate_contributions, lambda row: stats.contribution_deltas(row['amount'])),
+    'expense': (Expense, validate_expenses, None),
+}
+
+
+def ingest(kind, records):
+    """Validate records against prefetched users/projects and insert the valid ones.
+
+    Rows go in with one executemany per chunk, each chunk in its own
+    transaction together with its counter updates, so a failure part-way
+    keeps the chunks already committed. Returns a summary with per-row errors
+    indexed by position in the request body.
+    """
+    model, validate, deltas_for = KINDS[kind]
+    rows, errors = validate(records)
+    inserted = 0
+    for chunk in chunks(rows):
+        try:
+            # RETURNING gives this chunk's ids, whatever other writers insert meanwhile
+            ids = db.session.execute(insert(model).returning(model.id), chunk).scalars().all()
+            if deltas_for:
+                for project_id, deltas in counter_totals(chunk, deltas_for).items():
+                    stats.adjust(project_id, **deltas)
+            changes.record(kind, 'insert', *ids)
+            db.session.commit()
+            inserted += len(chunk)
+        except Exception as e:
+            db.session.rollback()
+            errors.append({'index': None, 'error': 'Chunk of %d rows failed: %s' % (len(chunk), e)})
+    errors.sort(key=lambda error: -1 if error['index'] is None else error['index'])
+    return {'received': len(records), 'inserted': inserted, 'failed': len(records) - inserted, 'errors': errors}
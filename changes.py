@@ -0,0 +1,221 @@
+"""Change feed for GET /changes: every write to the CRUD tables, in commit order.
+
+The mutating routes call record() instead of versions.bump(); it bumps the
+table version and appends (table, op, row id) to change_log in the same
+transaction, so the feed and the data can't disagree. The id of each entry
+is the sequence number clients resume from. Only ids are logged: rows are
+read when the feed is served, so a client always gets their current state.
+
+change_log is compacted to the newest CHANGE_LOG_RETAIN entries. A client
+whose position has been compacted away gets a 410 and must refetch.
+
+The feed relies on ids being handed out in commit order, which SQLite's
+single writer guarantees but PostgreSQL does not (a transaction holding a
+lower id can commit after a reader has moved past it). Elsewhere record()
+only bumps versions and /changes answers 501.
+
+Chat messages are not logged (transcripts are private), but MessageWaiters
+wakes /chat/history long-polls when a session's messages are committed.
+"""
+import datetime
+import threading
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.orm import Session, object_session
+
+from models import db, ChangeLog, ChatMessage, Project, Vote, Contribution, Budget, Expense
+import serializers
+import versions
+
+MODELS = {
+    'project': Project,
+    'vote': Vote,
+    'contribution': Contribution,
+    'budget': Budget,
+    'expense': Expense,
+}
+
+
+class ChangesCompacted(Exception):
+    """The requested position is no longer (or was never) in the log."""
+
+    def __init__(self, since, seq):
+        Exception.__init__(self, 'Changes after %d are not available; refetch, then resume from seq %d'
+                           % (since, seq))
+        self.seq = seq
+
+
+class ChangeFeed:
+    """Wakes long-polling readers on commit and compacts change_log as it grows."""
+
+    def __init__(self, retain=10000, compact_every=100, poll_interval=1.0):
+        self.retain = retain
+        self.compact_every = compact_every
+        # Upper bound on how late a reader notices commits made by other processes
+        self.poll_interval = poll_interval
+        self.condition = threading.Condition()
+        self.commits = 0
+        self.compactions = 0
+
+    def committed(self):
+        with self.condition:
+            self.commits += 1
+            self.condition.notify_all()
+            return self.commits % self.compact_every == 0
+
+    def wait(self, seen, timeout):
+        """Block until a commit after the one counted as seen, for at most timeout seconds."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.commits != seen, timeout)
+
+    def compact(self, connection):
+        table = ChangeLog.__table__
+        newest = connection.execute(select(func.max(table.c.id))).scalar()
+        if newest is None or newest <= self.retain:
+            return 0
+        deleted = connection.execute(table.delete().where(table.c.id <= newest - self.retain)).rowcount
+        self.compactions += 1
+        return deleted
+
+    def stats(self):
+        return {'commits': self.commits, 'compactions': self.compactions, 'retain': self.retain}
+
+
+class MessageWaiters:
+    """Per chat session commit counters, kept only while someone is waiting on the session."""
+
+    def __init__(self, poll_interval=1.0):
+        self.poll_interval = poll_interval
+        self.condition = threading.Condition()
+        self.watched = {}  # session id -> [commits, watchers]
+
+    def watch(self, session_id):
+        """Start watching session_id; returns the count to pass to wait()."""
+        with self.condition:
+            entry = self.watched.setdefault(session_id, [0, 0])
+            entry[1] += 1
+            return entry[0]
+
+    def unwatch(self, session_id):
+        with self.condition:
+            entry = self.watched[session_id]
+            entry[1] -= 1
+            if not entry[1]:
+                del self.watched[session_id]
+
+    def wait(self, session_id, seen, timeout):
+        with self.condition:
+            entry = self.watched[session_id]
+            self.condition.wait_for(lambda: entry[0] != seen, timeout)
+            return entry[0]
+
+    def committed(self, session_ids):
+        with self.condition:
+            woken = [self.watched[session_id] for session_id in session_ids if session_id in self.watched]
+            for entry in woken:
+                entry[0] += 1
+            if woken:
+                self.condition.notify_all()
+
+    def stats(self):
+        return {'sessions': len(self.watched), 'waiting': sum(entry[1] for entry in self.watched.values())}
+
+
+def feed():
+    return current_app.extensions['change_feed']
+
+
+def message_waiters():
+    return current_app.extensions['message_waiters']
+
+
+def available():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def record(table, op, *ids):
+    """Bump table's version and log op on the given row ids, in the current transaction."""
+    versions.bump(table)
+    if not ids or not available():
+        return
+    now = datetime.datetime.utcnow()
+    db.session.execute(insert(ChangeLog), [
+        {'table_name': table, 'op': op, 'row_id': row_id, 'created_at': now} for row_id in ids
+    ])
+    db.session.info['changes_recorded'] = True
+
+
+@event.listens_for(ChatMessage, 'after_insert')
+def message_stored(mapper, connection, target):
+    object_session(target).info.setdefault('chat_sessions', set()).add(target.session_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def notify(session):
+    recorded = session.info.pop('changes_recorded', False)
+    chat_sessions = session.info.pop('chat_sessions', None)
+    if not has_app_context():
+        return
+    waiters = current_app.extensions.get('message_waiters')
+    if chat_sessions and waiters:
+        waiters.committed(chat_sessions)
+    change_feed = current_app.extensions.get('change_feed')
+    if recorded and change_feed and change_feed.committed():
+        with db.engine.begin() as connection:
+            change_feed.compact(connection)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget(session):
+    session.info.pop('changes_recorded', None)
+    session.info.pop('chat_sessions', None)
+
+
+def latest():
+    return db.session.query(func.coalesce(func.max(ChangeLog.id), 0)).scalar()
+
+
+def read(since, tables=None, limit=500):
+    """Return (changes, seq) for up to limit entries after since, with the rows' current data.
+
+    seq is where the client resumes: the last entry returned, or, once it
+    has caught up, the newest entry in the log even if tables filtered it
+    out, so a filtered client isn't left behind by compaction.
+    """
+    newest = latest()
+    oldest = db.session.query(func.min(ChangeLog.id)).scalar()
+    # Behind the oldest retained entry, or ahead of the log (e.g. a seq from another database)
+    if since > newest or (oldest is not None and since < oldest - 1):
+        raise ChangesCompacted(since, newest)
+
+    query = db.session.query(ChangeLog.id, ChangeLog.table_name, ChangeLog.op, ChangeLog.row_id).filter(
+        ChangeLog.id > since, ChangeLog.id <= newest)
+    if tables is not None:
+        query = query.filter(ChangeLog.table_name.in_(tables))
+    entries = query.order_by(ChangeLog.id).limit(limit + 1).all()
+    if len(entries) > limit:
+        entries = entries[:limit]
+        seq = entries[-1][0]
+    else:
+        seq = max(since, newest)
+
+    # One query per table for the rows still present, whatever the number of entries
+    wanted = {}
+    for _, table, op, row_id in entries:
+        if op != 'delete':
+            wanted.setdefault(table, set()).add(row_id)
+    data = {}
+    for table, ids in wanted.items():
+        model = MODELS[table]
+        for row in serializers.rows(model).filter(model.id.in_(ids)):
+            data[table, row[0]] = serializers.to_dict(model, row)
+
+    return [{
+        'seq': entry_seq,
+        'table': table,
+        'op': op,
+        'id': row_id,
+        # None for deletes, and for rows deleted since (a later entry says so)
+        'data': data.get((table, row_id))
+    } for entry_seq, table, op, row_id in entries], seq
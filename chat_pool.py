@@ -0,0 +1,67 @@
+import threading
+from contextlib import contextmanager
+
+from lru import LRU
+
+
+class Pooled:
+    """A live chat with the lock that serializes turns on it."""
+
+    __slots__ = ('chat', 'lock', 'discarded')
+
+    def __init__(self, chat):
+        self.chat = chat
+        self.lock = threading.Lock()
+        self.discarded = False
+
+
+class ChatPool:
+    """Bounded LRU of live chat objects keyed by ChatSession.id.
+
+    Misses are filled by ``factory(session_id)``, which is expected to rebuild
+    the chat from the stored ChatMessage rows. The pool is per process, so a
+    session served by several workers is rehydrated once in each of them.
+
+    Chat objects are not thread-safe, so a turn (send, then trim) must run
+    inside turn(), which lets one request at a time use a session's chat.
+    """
+
+    def __init__(self, factory, maxsize=256):
+        self._factory = factory
+        self._chats = LRU(maxsize)
+
+    def _pooled(self, session_id):
+        pooled = self._chats.get(session_id)
+        if pooled is not None:
+            return pooled
+        # Build outside the lock so a slow rehydration doesn't block other sessions
+        return self._chats.setdefault(session_id, Pooled(self._factory(session_id)))
+
+    def get(self, session_id):
+        return self._pooled(session_id).chat
+
+    @contextmanager
+    def turn(self, session_id):
+        """Yield session_id's chat, holding it until the turn is over."""
+        pooled = self._pooled(session_id)
+        pooled.lock.acquire()
+        # Discarded while we waited (e.g. a failed stream left it broken): take the rebuilt one
+        while pooled.discarded:
+            pooled.lock.release()
+            pooled = self._pooled(session_id)
+            pooled.lock.acquire()
+        try:
+            yield pooled.chat
+        finally:
+            pooled.lock.release()
+
+    def discard(self, session_id):
+        pooled = self._chats.pop(session_id)
+        if pooled is not None:
+            pooled.discarded = True
+
+    def clear(self):
+        self._chats.clear()
+
+    def stats(self):
+        return self._chats.stats()
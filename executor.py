@@ -0,0 +1,117 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app
+
+from models import db
+
+
+class Saturated(Exception):
+    """Raised when a BoundedExecutor has no free slot for new work."""
+
+    def __init__(self, retry_after):
+        super().__init__('Executor is saturated, retry in %ss' % retry_after)
+        self.retry_after = retry_after
+
+
+class ExecutorTimeout(TimeoutError):
+    """Raised by BoundedExecutor.call when the result isn't ready within the executor's timeout."""
+
+    def __init__(self, name, timeout):
+        super().__init__('%s call took longer than %ss' % (name, timeout))
+        self.name = name
+
+
+class BoundedExecutor:
+    """Thread pool with a hard cap on running + queued calls.
+
+    At most ``max_workers`` calls run at once and ``max_queue`` more may wait.
+    Anything beyond that is rejected immediately with Saturated, so a burst of
+    slow calls can't tie up every request thread in the server.
+    """
+
+    def __init__(self, max_workers=4, max_queue=16, timeout=30, name='worker'):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.avg_latency = 0.0
+
+    def retry_after(self):
+        # Rough time for the current backlog to drain, in whole seconds
+        backlog = self.in_flight / float(self.max_workers)
+        return max(1, int(math.ceil(self.avg_latency * backlog)))
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Saturated(self.retry_after())
+        with self._lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def release(self, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.avg_latency = elapsed if self.completed == 1 else 0.9 * self.avg_latency + 0.1 * elapsed
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        started = self.acquire()
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self.release(started)
+            raise
+        future.add_done_callback(lambda _: self.release(started))
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn in the pool and wait for it, raising ExecutorTimeout after self.timeout."""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise ExecutorTimeout(self.name, self.timeout)
+
+    def call_in_app_context(self, fn, *args, **kwargs):
+        """call() fn in its own app context, and so its own database session."""
+        app = current_app._get_current_object()
+        # Hand our connection back while we wait: callers blocked on the workers, each holding one,
+        # would otherwise use up the pool and leave the workers none
+        db.session.close()
+
+        def run():
+            with app.app_context():
+                return fn(*args, **kwargs)
+
+        return self.call(run)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'avg_latency': round(self.avg_latency, 4)
+            }
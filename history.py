@@ -0,0 +1,106 @@
+import os
+
+SUMMARY_PREFIX = "Summary of our conversation so far:"
+SUMMARY_ACK = "Thanks, I'll keep that in mind."
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text; good enough for budgeting
+    return len(text) // 4 + 1
+
+
+def turn_tokens(turn):
+    return sum(estimate_tokens(part) for part in turn['parts'])
+
+
+def as_turns(history):
+    """Convert Gemini Content objects (or dicts) to plain {'role', 'parts'} dicts."""
+    turns = []
+    for item in history:
+        if isinstance(item, dict):
+            turns.append({'role': item['role'], 'parts': list(item['parts'])})
+        else:
+            turns.append({'role': item.role, 'parts': [part.text for part in item.parts]})
+    return turns
+
+
+def summarize_extractive(summary, turns, max_tokens):
+    """Fold turns into the running summary, keeping the newest lines within max_tokens."""
+    lines = summary.splitlines() if summary else []
+    for turn in turns:
+        text = ' '.join(' '.join(turn['parts']).split())
+        speaker = 'User' if turn['role'] == 'user' else 'Assistant'
+        # First sentence (capped) is usually enough to remember what a turn was about
+        first = text.split('. ')[0][:200]
+        lines.append('- %s: %s' % (speaker, first))
+
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        used += estimate_tokens(line)
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return '\n'.join(reversed(kept))
+
+
+class HistoryWindow:
+    """Keeps the replayed chat history under a token budget.
+
+    The most recent turns are replayed verbatim, newest first, until
+    ``token_budget`` is used up. Everything older is folded into a rolling
+    summary of at most ``summary_tokens``, sent as one extra user/model
+    exchange. The system priming turns in front are not counted.
+
+    ``summarizer(previous_summary, turns, max_tokens)`` can be swapped for
+    an LLM-backed one; the default is extractive and makes no calls.
+    """
+
+    def __init__(self, token_budget=3000, summary_tokens=400, min_recent_turns=2, summarizer=None):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.min_recent_turns = min_recent_turns
+        self.summarizer = summarizer or summarize_extractive
+
+    def split(self, turns):
+        """Return (older, recent) where recent fits the budget and starts with a user turn."""
+        used = 0
+        cut = len(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            used += turn_tokens(turns[i])
+            if used > self.token_budget and len(turns) - i > self.min_recent_turns:
+                break
+            cut = i
+        # Gemini needs the replayed turns to open with the user
+        while cut < len(turns) and turns[cut]['role'] != 'user':
+            cut += 1
+        return turns[:cut], turns[cut:]
+
+    def strip_summary(self, turns):
+        """Split a leading summary exchange off turns, returning (summary, remaining turns)."""
+        if turns and turns[0]['parts'] and turns[0]['parts'][0].startswith(SUMMARY_PREFIX):
+            return turns[0]['parts'][0][len(SUMMARY_PREFIX):].strip(), turns[2:]
+        return '', turns
+
+    def needs_trim(self, turns):
+        _, turns = self.strip_summary(turns)
+        return sum(turn_tokens(turn) for turn in turns) > self.token_budget
+
+    def build(self, priming, turns):
+        """Return priming + (summary exchange) + recent turns for a chat history."""
+        summary, turns = self.strip_summary(turns)
+        older, recent = self.split(turns)
+        if older:
+            summary = self.summarizer(summary, older, self.summary_tokens)
+
+        history = list(priming)
+        if summary:
+            history.append({'role': 'user', 'parts': ['%s\n%s' % (SUMMARY_PREFIX, summary)]})
+            history.append({'role': 'model', 'parts': [SUMMARY_ACK]})
+        return history + recent
+
+
+history_window = HistoryWindow(
+    token_budget=int(os.getenv('CHAT_HISTORY_TOKENS', 3000)),
+    summary_tokens=int(os.getenv('CHAT_SUMMARY_TOKENS', 400))
+)
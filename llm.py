@@ -0,0 +1,190 @@
+"""Chat model backends for CBAA.
+
+A backend has ``start_chat(history)`` returning a chat object with a
+mutable ``history`` list and ``send_message(prompt, stream=False)``, which
+returns a response with ``.text`` (or, when streaming, an iterable of
+chunks with ``.text``). That is the subset of google.generativeai that
+cba.py uses, so the Gemini backend just hands out the SDK's own objects.
+
+LLM_BACKEND=fake selects FakeBackend, configured by the FAKE_LLM_*
+variables below, for load tests and offline development.
+"""
+import math
+import os
+import random
+import threading
+import time
+
+from history import estimate_tokens
+
+
+class GeminiBackend:
+    def __init__(self, model_name='gemini-pro', api_key=None):
+        if not api_key:
+            raise ValueError('GEMINI_API_KEY is not set; set it, or use LLM_BACKEND=fake for local runs')
+        # Imported here: the SDK alone takes about a second to import
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def start_chat(self, history):
+        return self.model.start_chat(history=history)
+
+
+class FakeLLMError(Exception):
+    """Injected failure from FakeBackend."""
+
+
+def parse_latency(spec):
+    """Build a sampler (returning seconds) from e.g. 'fixed:0.5', 'uniform:0.2:1.5',
+    'lognormal:0.8:0.6' (median, sigma) or 'exponential:0.5' (mean)."""
+    name, _, args = spec.partition(':')
+    values = [float(arg) for arg in args.split(':')] if args else []
+    if name == 'fixed':
+        return lambda rng: values[0]
+    if name == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == 'lognormal':
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    if name == 'exponential':
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    raise ValueError('Unknown latency distribution %r' % spec)
+
+
+class UsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeStream:
+    """Iterable of chunks; usage_metadata is filled in once it has been consumed."""
+
+    def __init__(self):
+        self.chunks = iter(())
+        self.usage_metadata = None
+
+    def __iter__(self):
+        return self.chunks
+
+
+REPLY_WORDS = (
+    'Start small with a clear goal and ask neighbours what they need. Keep a simple list of costs, '
+    'split them into must-haves and nice-to-haves, and look for local groups or businesses that '
+    'could donate materials or time. Plan a first meeting, share updates often and celebrate '
+    'every step so people stay involved.'
+).split()
+
+
+class FakeChat:
+    def __init__(self, backend, history):
+        self.backend = backend
+        self.history = list(history)
+
+    def _reply(self):
+        words = self.backend.reply_tokens * 3 // 4
+        return ' '.join(REPLY_WORDS[n % len(REPLY_WORDS)] for n in range(max(words, 1)))
+
+    def _usage(self, prompt, reply):
+        context = sum(estimate_tokens(part) for turn in self.history for part in turn['parts'])
+        return UsageMetadata(context + estimate_tokens(prompt), estimate_tokens(reply))
+
+    def _record(self, prompt, reply):
+        self.history.append({'role': 'user', 'parts': [prompt]})
+        self.history.append({'role': 'model', 'parts': [reply]})
+
+    def send_message(self, prompt, stream=False):
+        backend = self.backend
+        reply = self._reply()
+        words = reply.split(' ')
+        chunks = [' '.join(words[n:n + backend.chunk_words]) + ' ' for n in range(0, len(words), backend.chunk_words)]
+        fail_at = backend.failure_point(len(chunks))
+        if not stream:
+            backend.sleep(backend.first_token_delay() + backend.chunk_delay * len(chunks))
+            if fail_at is not None:
+                raise FakeLLMError('Injected failure')
+            usage = self._usage(prompt, reply)
+            self._record(prompt, reply)
+            return FakeResponse(reply, usage)
+
+        response = FakeStream()
+
+        def generate():
+            backend.sleep(backend.first_token_delay())
+            for n, chunk in enumerate(chunks):
+                if n == fail_at:
+                    raise FakeLLMError('Injected failure after %d chunks' % n)
+                if n:
+                    backend.sleep(backend.chunk_delay)
+                yield FakeResponse(chunk)
+            response.usage_metadata = self._usage(prompt, reply)
+            self._record(prompt, reply)
+
+        response.chunks = generate()
+        return response
+
+
+class FakeBackend:
+    """Local stand-in for Gemini with configurable latency, streaming and failures.
+
+    latency          distribution of time to the first token (see parse_latency)
+    chunk_delay      seconds between streamed chunks
+    chunk_words      words per streamed chunk
+    reply_tokens     approximate reply length
+    failure_rate     fraction of calls that raise FakeLLMError; streamed calls
+                     fail part-way through, after some chunks were sent
+    """
+
+    def __init__(self, latency='lognormal:0.8:0.5', chunk_delay=0.03, chunk_words=8,
+                 reply_tokens=200, failure_rate=0.0, seed=None):
+        self.latency_spec = latency
+        self._latency = parse_latency(latency)
+        self.chunk_delay = chunk_delay
+        self.chunk_words = chunk_words
+        self.reply_tokens = reply_tokens
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.sleep = time.sleep
+
+    def first_token_delay(self):
+        with self._lock:
+            return max(0.0, self._latency(self._rng))
+
+    def failure_point(self, chunks):
+        """Chunk index to fail at, or None."""
+        with self._lock:
+            if self._rng.random() >= self.failure_rate:
+                return None
+            return self._rng.randrange(chunks)
+
+    def start_chat(self, history):
+        return FakeChat(self, history)
+
+
+def fake_from_env():
+    seed = os.getenv('FAKE_LLM_SEED')
+    return FakeBackend(
+        latency=os.getenv('FAKE_LLM_LATENCY', 'lognormal:0.8:0.5'),
+        chunk_delay=float(os.getenv('FAKE_LLM_CHUNK_DELAY', 0.03)),
+        chunk_words=int(os.getenv('FAKE_LLM_CHUNK_WORDS', 8)),
+        reply_tokens=int(os.getenv('FAKE_LLM_REPLY_TOKENS', 200)),
+        failure_rate=float(os.getenv('FAKE_LLM_FAILURE_RATE', 0.0)),
+        seed=int(seed) if seed else None
+    )
+
+
+def create_backend(name=None, api_key=None):
+    name = name or os.getenv('LLM_BACKEND', 'gemini')
+    if name == 'fake':
+        return fake_from_env()
+    if name == 'gemini':
+        return GeminiBackend(os.getenv('GEMINI_MODEL', 'gemini-pro'), api_key)
+    raise ValueError('Unknown LLM_BACKEND %r' % name)
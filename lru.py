@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+
+class LRU:
+    """Thread-safe bounded map that drops the least recently used entries past maxsize.
+
+    Shared by the in-process caches; each keeps its own idea of when an
+    entry is still good (a TTL, table versions) and passes it to get() as
+    valid. Hold ``lock`` (re-entrant) to make several calls atomic.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.RLock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, valid=None):
+        """Return key's value and mark it recently used, or None; entries failing valid(value) are dropped."""
+        with self.lock:
+            value = self._entries.get(key)
+            if value is not None and (valid is None or valid(value)):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if value is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self.lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def setdefault(self, key, value):
+        """Store value unless key is already present; return whichever is stored."""
+        with self.lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing
+            self.set(key, value)
+            return value
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,214 @@
+import bisect
+import cProfile
+import os
+import pstats
+import tempfile
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def label_text(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append('%s="%s"' % (name, value))
+    return '{%s}' % ','.join(pairs)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name + label_text(self.labels, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._values.items()}
+        names = self.labels + ('le',)
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket' + label_text(names, labels + (bound,)), cumulative
+            yield self.name + '_sum' + label_text(self.labels, labels), total
+            yield self.name + '_count' + label_text(self.labels, labels), count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Everything registered, in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            for name, value in metric.samples():
+                lines.append('%s %s' % (name, repr(float(value)) if isinstance(value, float) else value))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route', ('method', 'route', 'status')))
+http_sql_statements = registry.register(Histogram(
+    'http_request_sql_statements', 'SQL statements run per request', ('route',), buckets=COUNT_BUCKETS))
+sql_duration = registry.register(Histogram(
+    'db_statement_duration_seconds', 'SQL statement execution time, by route', ('route',)))
+llm_duration = registry.register(Histogram(
+    'llm_request_duration_seconds', 'Gemini call latency, to the end of the reply', ('call', 'outcome')))
+llm_first_chunk = registry.register(Histogram(
+    'llm_first_chunk_seconds', 'Time to the first streamed chunk of a Gemini reply', ('call',)))
+llm_tokens = registry.register(Counter(
+    'llm_tokens_total', 'Tokens sent to and received from Gemini', ('call', 'direction')))
+chat_limited = registry.register(Counter(
+    'chat_limited_total', 'Chat requests rejected with 429, by limit', ('reason',)))
+
+
+def route_label():
+    if not has_request_context():
+        return 'background'
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def observe_llm(call, seconds, prompt_tokens=0, response_tokens=0, outcome='ok'):
+    llm_duration.observe(seconds, call, outcome)
+    if prompt_tokens:
+        llm_tokens.inc(call, 'prompt', amount=prompt_tokens)
+    if response_tokens:
+        llm_tokens.inc(call, 'response', amount=response_tokens)
+
+
+def install_sql_hooks(app):
+    with app.app_context():
+        engine = db.engine
+
+    # The start time goes on the execution context, which is dropped with the statement even when
+    # it fails and after_cursor_execute never runs
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_started', None)
+        if started is not None:
+            sql_duration.observe(time.perf_counter() - started, route_label())
+        if has_request_context():
+            g.sql_statements = g.get('sql_statements', 0) + 1
+
+
+# cProfile can only be active on one thread at a time
+_profile_lock = threading.Lock()
+
+
+def start_profile():
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+
+def finish_profile(app, profile, response):
+    try:
+        profile.disable()
+    finally:
+        _profile_lock.release()
+    directory = app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '%s-%d.prof' % (request.endpoint or 'unmatched', time.time() * 1000))
+    profile.dump_stats(path)
+    top = pstats.Stats(profile).sort_stats('cumulative')
+    app.logger.info('Profiled %s %s -> %s', request.method, request.path, path)
+    response.headers['X-Profile-File'] = path
+    response.headers['X-Profile-Calls'] = str(top.total_calls)
+    return response
+
+
+def install(app):
+    """Record route latency and SQL counts for every request of app.
+
+    With PROFILE_REQUESTS on, a request carrying ``X-Profile: 1`` is run
+    under cProfile and the stats are written to PROFILE_DIR.
+    """
+    app.config.setdefault('PROFILE_REQUESTS', os.getenv('PROFILE_REQUESTS') == '1')
+    app.config.setdefault('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'astonhack-profiles'))
+    install_sql_hooks(app)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        g.sql_statements = 0
+        if app.config['PROFILE_REQUESTS'] and request.headers.get('X-Profile') == '1':
+            g.profile = start_profile()
+
+    @app.after_request
+    def record_request(response):
+        route = route_label()
+        http_duration.observe(time.perf_counter() - g.request_started, request.method, route, response.status_code)
+        http_sql_statements.observe(g.sql_statements, route)
+        if g.get('profile') is not None:
+            response = finish_profile(app, g.pop('profile'), response)
+        return response
+
+    @app.teardown_request
+    def stop_profile(exc):
+        # Still running if the request ended before after_request got to it
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.disable()
+            _profile_lock.release()
@@ -0,0 +1,235 @@
+"""Schema migrations for existing SQLite databases.
+
+``flask --app app init-db`` creates missing tables with the current schema,
+but SQLite tables created before a schema change need to be altered in
+place. Each migration below does that for one change. The last applied
+migration is recorded in ``PRAGMA user_version``.
+
+    flask --app app migrate
+    python migrate.py instance/community.db
+"""
+import sqlite3
+import sys
+
+
+class MigrationError(Exception):
+    pass
+
+
+def has_table(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def has_column(conn, table, column):
+    return any(row[1] == column for row in conn.execute('PRAGMA table_info(%s)' % table))
+
+
+def create_index(conn, name, table, columns, unique=False):
+    conn.execute('CREATE %sINDEX IF NOT EXISTS %s ON %s (%s)' % (
+        'UNIQUE ' if unique else '', name, table, ', '.join(columns)))
+
+
+def rebuild_table(conn, table, create):
+    """Recreate table from create (a CREATE TABLE with a %s for the name), keeping its rows, indexes and triggers.
+
+    For schema changes ALTER TABLE can't make. Foreign keys must be off (the sqlite3 default).
+    """
+    if not has_table(conn, table):
+        return
+    extras = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,))]
+    conn.execute(create % ('new_' + table))
+    columns = ', '.join(row[1] for row in conn.execute('PRAGMA table_info(new_%s)' % table)
+                        if has_column(conn, table, row[1]))
+    conn.execute('INSERT INTO new_%s (%s) SELECT %s FROM %s' % (table, columns, columns, table))
+    conn.execute('DROP TABLE %s' % table)
+    conn.execute('ALTER TABLE new_%s RENAME TO %s' % (table, table))
+    for sql in extras:
+        conn.execute(sql)
+
+
+def project_keys_and_indexes(conn):
+    """Unique project titles, integer project_id FKs and lookup indexes."""
+    if not has_table(conn, 'project'):
+        return
+    dupes = conn.execute(
+        'SELECT title, COUNT(*) FROM project GROUP BY title HAVING COUNT(*) > 1'
+    ).fetchall()
+    if dupes:
+        raise MigrationError('Duplicate project titles must be renamed first: %s' % ', '.join(
+            '%r (x%d)' % row for row in dupes))
+    create_index(conn, 'ix_project_title', 'project', ['title'], unique=True)
+
+    for table in ('vote', 'contribution', 'expense'):
+        if not has_table(conn, table):
+            continue
+        if not has_column(conn, table, 'project_id'):
+            conn.execute('ALTER TABLE %s ADD COLUMN project_id INTEGER REFERENCES project (id)' % table)
+        conn.execute(
+            'UPDATE %s SET project_id = (SELECT project.id FROM project WHERE project.title = %s.project_title) '
+            'WHERE project_id IS NULL AND project_title IS NOT NULL' % (table, table)
+        )
+        create_index(conn, 'ix_%s_project_id' % table, table, ['project_id'])
+        create_index(conn, 'ix_%s_project_title' % table, table, ['project_title'])
+
+    for table in ('vote', 'contribution'):
+        if has_table(conn, table):
+            create_index(conn, 'ix_%s_user_username' % table, table, ['user_username'])
+
+
+def project_stats(conn):
+    """Counters table for per-project vote and contribution totals, backfilled."""
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS project_stats ('
+        'project_id INTEGER NOT NULL REFERENCES project (id), '
+        'votes_up INTEGER NOT NULL, votes_down INTEGER NOT NULL, votes_total INTEGER NOT NULL, '
+        'contributions INTEGER NOT NULL, contributed FLOAT NOT NULL, '
+        'PRIMARY KEY (project_id))'
+    )
+    if not has_table(conn, 'project'):
+        return
+    votes = has_table(conn, 'vote')
+    contributions = has_table(conn, 'contribution')
+    conn.execute('DELETE FROM project_stats')
+    conn.execute(
+        'INSERT INTO project_stats SELECT p.id, '
+        + ("(SELECT COUNT(*) FROM vote v WHERE v.project_id = p.id AND v.vote_type = 'up'), "
+           "(SELECT COUNT(*) FROM vote v WHERE v.project_id = p.id AND v.vote_type = 'down'), "
+           '(SELECT COUNT(*) FROM vote v WHERE v.project_id = p.id), ' if votes else '0, 0, 0, ')
+        + ('(SELECT COUNT(*) FROM contribution c WHERE c.project_id = p.id), '
+           '(SELECT COALESCE(SUM(c.amount), 0) FROM contribution c WHERE c.project_id = p.id) '
+           if contributions else '0, 0 ')
+        + 'FROM project p'
+    )
+
+
+def table_versions(conn):
+    """Per-table version counters used for ETags."""
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS table_version ('
+        'name VARCHAR(50) NOT NULL, version INTEGER NOT NULL, updated_at DATETIME NOT NULL, '
+        'PRIMARY KEY (name))'
+    )
+
+
+def expense_report_indexes(conn):
+    """Composite indexes behind the budget report and project spend queries."""
+    if has_table(conn, 'expense'):
+        create_index(conn, 'ix_expense_created_by_date', 'expense', ['created_by', 'date'])
+        create_index(conn, 'ix_expense_project_id_date', 'expense', ['project_id', 'date'])
+
+
+def search_indexes(conn):
+    """FTS5 indexes (and their sync triggers) for projects, vote comments and chat messages."""
+    from search import INDEXES, install
+    install(conn.execute, [table for table in INDEXES if has_table(conn, table)])
+
+
+def change_log(conn):
+    """Append-only feed of writes to the CRUD tables behind GET /changes."""
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS change_log ('
+        'id INTEGER NOT NULL, table_name VARCHAR(50) NOT NULL, op VARCHAR(10) NOT NULL, '
+        'row_id INTEGER NOT NULL, created_at DATETIME NOT NULL, '
+        'PRIMARY KEY (id AUTOINCREMENT))'
+    )
+
+
+def chat_message_index(conn):
+    """(session_id, id) index for reading transcripts and message deltas in order."""
+    if has_table(conn, 'chat_message'):
+        create_index(conn, 'ix_chat_message_session_id_id', 'chat_message', ['session_id', 'id'])
+
+
+def project_autoincrement(conn):
+    """AUTOINCREMENT project ids, so a deleted project's id is never handed to a new one."""
+    rebuild_table(conn, 'project', (
+        'CREATE TABLE %s ('
+        'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, title VARCHAR(100) NOT NULL, description TEXT NOT NULL, status VARCHAR(20), '
+        'budget FLOAT NOT NULL, created_by INTEGER NOT NULL, created_at DATETIME, '
+        'FOREIGN KEY(created_by) REFERENCES user (id))'))
+
+
+
+def created_by_usernames(conn):
+    """created_by holds the creator's username, so declare it as one (it was an INTEGER user.id FK)."""
+    rebuild_table(conn, 'project', (
+        'CREATE TABLE %s ('
+        'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, title VARCHAR(100) NOT NULL, description TEXT NOT NULL, '
+        'status VARCHAR(20), budget FLOAT NOT NULL, created_by VARCHAR(50) NOT NULL, created_at DATETIME, '
+        'FOREIGN KEY(created_by) REFERENCES user (username))'))
+    rebuild_table(conn, 'budget', (
+        'CREATE TABLE %s ('
+        'id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, mandatory FLOAT, essential FLOAT, discretionary FLOAT, '
+        'total FLOAT NOT NULL, created_by VARCHAR(50) NOT NULL, created_at DATETIME, '
+        'PRIMARY KEY (id), FOREIGN KEY(created_by) REFERENCES user (username))'))
+    rebuild_table(conn, 'expense', (
+        'CREATE TABLE %s ('
+        'id INTEGER NOT NULL, description VARCHAR(100) NOT NULL, amount FLOAT NOT NULL, '
+        'category VARCHAR(20) NOT NULL, project_title VARCHAR, project_id INTEGER, date DATETIME, '
+        'created_by VARCHAR(50) NOT NULL, '
+        'PRIMARY KEY (id), FOREIGN KEY(project_title) REFERENCES project (title), '
+        'FOREIGN KEY(project_id) REFERENCES project (id), FOREIGN KEY(created_by) REFERENCES user (username))'))
+
+
+# (version, migration) in the order they must run; only ever append
+MIGRATIONS = [
+    (1, project_keys_and_indexes),
+    (2, project_stats),
+    (3, table_versions),
+    (4, expense_report_indexes),
+    (5, search_indexes),
+    (6, change_log),
+    (7, chat_message_index),
+    (8, project_autoincrement),
+    (9, created_by_usernames),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def stamp(conn, version=LATEST):
+    conn.execute('PRAGMA user_version = %d' % version)
+
+
+def upgrade(conn, log=print):
+    """Apply every pending migration, each in its own transaction."""
+    conn.isolation_level = None
+    version = current_version(conn)
+    applied = []
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        conn.execute('BEGIN')
+        try:
+            migration(conn)
+            stamp(conn, target)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        log('Applied migration %d: %s' % (target, migration.__name__))
+        applied.append(target)
+    return applied
+
+
+def upgrade_file(path, log=print):
+    conn = sqlite3.connect(path)
+    try:
+        return upgrade(conn, log)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit('usage: python migrate.py path/to/community.db')
+    if not upgrade_file(sys.argv[1]):
+        print('Database is up to date.')
@@ -3,6 +3,64 @@ import datetime
 
 db = SQLAlchemy()
 
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    username = db.Column(db.String(50), unique=True, nullable=False)
+    password = db.Column(db.String(255), nullable=False)
+
+class Project(db.Model):
+    # Ids are never reused, so rows still holding a deleted project's id can't attach to a new one
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(100), unique=True, index=True, nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='proposed')
+    budget = db.Column(db.Float, nullable=False)
+    created_by = db.Column(db.String(50), db.ForeignKey('user.username'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+class Contribution(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_username = db.Column(db.String(50), db.ForeignKey('user.username'), index=True, nullable=False)
+    project_title = db.Column(db.String, db.ForeignKey('project.title'), index=True, nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), index=True, nullable=True)
+    amount = db.Column(db.Float, nullable=False)
+    date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+class Vote(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_username = db.Column(db.String(50), db.ForeignKey('user.username'), index=True, nullable=False)
+    project_title = db.Column(db.String, db.ForeignKey('project.title'), index=True, nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), index=True, nullable=True)
+    vote_type = db.Column(db.String(10), nullable=False)
+    comment = db.Column(db.Text, nullable=True)
+    date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+class Budget(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    mandatory = db.Column(db.Float, default=0)
+    essential = db.Column(db.Float, default=0)
+    discretionary = db.Column(db.Float, default=0)
+    total = db.Column(db.Float, nullable=False)
+    created_by = db.Column(db.String(50), db.ForeignKey('user.username'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+class Expense(db.Model):
+    __table_args__ = (
+        db.Index('ix_expense_created_by_date', 'created_by', 'date'),
+        db.Index('ix_expense_project_id_date', 'project_id', 'date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(100), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    category = db.Column(db.String(20), nullable=False)
+    project_title = db.Column(db.String, db.ForeignKey('project.title'), index=True, nullable=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), index=True, nullable=True)
+    date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    created_by = db.Column(db.String(50), db.ForeignKey('user.username'), nullable=False)
+
 class ChatSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) 
@@ -12,9 +70,38 @@ class ChatSession(db.Model):
     status = db.Column(db.String(20), default='active')
 
 class ChatMessage(db.Model):
+    __table_args__ = (
+        # Transcripts and since_message_id deltas are read in id order per session
+        db.Index('ix_chat_message_session_id_id', 'session_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('chat_session.id'), nullable=False)
     is_user = db.Column(db.Boolean, default=True)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    meta_data = db.Column(db.JSON, nullable=True)
\ No newline at end of file
+    meta_data = db.Column(db.JSON, nullable=True)
+
+class ProjectStats(db.Model):
+    # Running per-project totals, kept in step by the vote and contribution routes
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    votes_up = db.Column(db.Integer, nullable=False, default=0)
+    votes_down = db.Column(db.Integer, nullable=False, default=0)
+    votes_total = db.Column(db.Integer, nullable=False, default=0)
+    contributions = db.Column(db.Integer, nullable=False, default=0)
+    contributed = db.Column(db.Float, nullable=False, default=0)
+
+class TableVersion(db.Model):
+    # Bumped by every write to the named table; drives the ETags on read routes
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class ChangeLog(db.Model):
+    # Append-only feed of writes behind GET /changes; id is the sequence number clients resume from
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
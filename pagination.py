@@ -0,0 +1,82 @@
+import datetime
+from urllib.parse import urlencode
+
+from flask import request
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class InvalidQuery(ValueError):
+    """A query-string parameter couldn't be parsed."""
+
+
+def parse_int(name, default=None, minimum=0, maximum=None):
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise InvalidQuery('%s must be an integer' % name)
+    if value < minimum:
+        raise InvalidQuery('%s must be at least %d' % (name, minimum))
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def parse_datetime(name):
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(raw)
+    except ValueError:
+        raise InvalidQuery('%s must be an ISO 8601 date or datetime' % name)
+
+
+def apply_filters(query, filters):
+    """Apply request filters described as (param, column, op) with op in eq/since/until."""
+    for param, column, op in filters:
+        if op == 'eq':
+            value = request.args.get(param)
+            if value is not None:
+                query = query.filter(column == value)
+        elif op == 'since':
+            value = parse_datetime(param)
+            if value is not None:
+                query = query.filter(column >= value)
+        elif op == 'until':
+            value = parse_datetime(param)
+            if value is not None:
+                query = query.filter(column < value)
+    return query
+
+
+def keyset_page(query, model, filters=(), row_id=None):
+    """Return (rows, next_after_id) for ?after_id=&limit= over model.id ascending.
+
+    Seeks past after_id on the primary key, so every page costs the same
+    no matter how deep into the table it is. ``row_id`` picks the id out of
+    a result row when the query returns tuples rather than model instances.
+    """
+    after_id = parse_int('after_id', default=0)
+    limit = parse_int('limit', default=DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+
+    query = apply_filters(query, filters)
+    rows = query.filter(model.id > after_id).order_by(model.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, row_id(rows[-1]) if row_id else rows[-1].id
+    return rows, None
+
+
+def add_page_headers(response, next_after_id):
+    # The body stays a plain list so existing clients keep working; the cursor travels in headers
+    if next_after_id is not None:
+        args = request.args.to_dict()
+        args['after_id'] = next_after_id
+        response.headers['Link'] = '<%s?%s>; rel="next"' % (request.base_url, urlencode(args))
+        response.headers['X-Next-After-Id'] = str(next_after_id)
+    return response
@@ -0,0 +1,43 @@
+import functools
+import hashlib
+import hmac
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Werkzeug's own default; ~0.1 s and 32 MB per hash. Tune with PASSWORD_HASH_METHOD,
+# e.g. 'scrypt:16384:8:1' or 'pbkdf2:sha256:600000'.
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+def hash_password(password, method=DEFAULT_METHOD):
+    return generate_password_hash(password, method=method)
+
+
+def verify_legacy(stored, password):
+    # 'sha256$salt$hexdigest' as written by Werkzeug < 2.3 with method='sha256'
+    _, salt, digest = stored.split('$', 2)
+    expected = hmac.new(salt.encode('utf-8'), password.encode('utf-8'), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+
+@functools.lru_cache(maxsize=None)
+def stored_prefix(method):
+    """The prefix Werkzeug writes for method, with its defaults filled in ('scrypt' -> 'scrypt:32768:8:1')."""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def verify(stored, password, method=DEFAULT_METHOD):
+    """Return (matches, needs_rehash) for a stored hash.
+
+    needs_rehash is True when the password matched but the hash was made
+    with different parameters than method, so the caller can store a fresh
+    hash while it still has the plain-text password.
+    """
+    if stored.startswith('sha256$'):
+        matches = verify_legacy(stored, password)
+    else:
+        try:
+            matches = check_password_hash(stored, password)
+        except ValueError:
+            return False, False
+    return matches, matches and stored.split('$', 1)[0] != stored_prefix(method)
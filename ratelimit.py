@@ -0,0 +1,185 @@
+import itertools
+import math
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from lru import LRU
+
+
+class RateLimited(Exception):
+    """Raised when a client is over its request rate or concurrency cap."""
+
+    def __init__(self, message, retry_after, reason):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def refill(tokens, updated, now, capacity, rate):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryStore:
+    """Token buckets for one process. Idle buckets are refilled anyway, so the oldest are dropped first."""
+
+    def __init__(self, maxsize=100000):
+        self._buckets = LRU(maxsize)
+
+    def take(self, key, capacity, rate, cost=1):
+        """Spend cost tokens from key's bucket; return seconds to wait, or 0 when allowed."""
+        now = time.monotonic()
+        with self._buckets.lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = refill(tokens, updated, now, capacity, rate)
+            wait = 0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            self._buckets.set(key, (tokens, now))
+        return wait
+
+
+class SqliteStore:
+    """Token buckets shared by every process using the same file.
+
+    Every purge_every takes, buckets idle long enough to have refilled are
+    deleted; a missing bucket starts full, so nothing changes for the client.
+    """
+
+    def __init__(self, path, purge_every=1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._takes = itertools.count(1)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_bucket ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, rate, cost=1):
+        conn = self._connect()
+        # Wall-clock time, since the buckets are shared between processes
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_bucket WHERE key = ?', (key,)).fetchone()
+            tokens = refill(row[0], row[1], now, capacity, rate) if row else capacity
+            wait = 0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            conn.execute('INSERT OR REPLACE INTO rate_bucket (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if next(self._takes) % self.purge_every == 0:
+            self.purge_idle(capacity / rate)
+        return wait
+
+    def purge_idle(self, older_than=3600):
+        conn = self._connect()
+        conn.execute('DELETE FROM rate_bucket WHERE updated < ?', (time.time() - older_than,))
+
+
+class ChatLimits:
+    """Token-bucket rate limit plus a cap on concurrent LLM calls, per client key.
+
+    ``rate`` is tokens per second and ``burst`` the bucket size; each chat
+    request costs one token. The concurrency cap is kept in process.
+    """
+
+    def __init__(self, store, rate=0.5, burst=10, max_concurrent=2):
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rate_limited = 0
+        self.concurrency_limited = 0
+
+    def check_rate(self, key):
+        wait = self.store.take(key, self.burst, self.rate)
+        with self._lock:
+            if not wait:
+                self.allowed += 1
+                return
+            self.rate_limited += 1
+        raise RateLimited('Too many chat requests, slow down', int(math.ceil(wait)), 'rate')
+
+    def acquire(self, key):
+        with self._lock:
+            if self._in_flight.get(key, 0) >= self.max_concurrent:
+                self.concurrency_limited += 1
+                raise RateLimited('Too many chat replies in progress, wait for one to finish', 1, 'concurrency')
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def release(self, key):
+        with self._lock:
+            remaining = self._in_flight.get(key, 0) - 1
+            if remaining > 0:
+                self._in_flight[key] = remaining
+            else:
+                self._in_flight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'max_concurrent': self.max_concurrent,
+                'store': type(self.store).__name__,
+                'clients_in_flight': len(self._in_flight),
+                'in_flight': sum(self._in_flight.values()),
+                'allowed': self.allowed,
+                'rate_limited': self.rate_limited,
+                'concurrency_limited': self.concurrency_limited
+            }
+
+
+def client_key():
+    # Logged-in users are limited as themselves wherever they connect from
+    if 'username' in session:
+        return 'user:%s' % session['username']
+    return 'ip:%s' % request.remote_addr
+
+
+def limit_chat(concurrent=True):
+    """Apply the app's ChatLimits to a view; ``concurrent`` holds a slot until the response is closed."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limits = current_app.extensions['chat_limits']
+            key = client_key()
+            limits.check_rate(key)
+            if not concurrent:
+                return view(*args, **kwargs)
+            limits.acquire(key)
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                limits.release(key)
+                raise
+            if response.is_streamed:
+                # Streamed replies keep the slot until the last chunk is sent
+                response.call_on_close(lambda: limits.release(key))
+            else:
+                limits.release(key)
+            return response
+        return wrapper
+    return decorator
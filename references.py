@@ -0,0 +1,77 @@
+import time
+
+from flask import current_app
+from sqlalchemy import select
+
+from lru import LRU
+from models import db, User, Project
+
+
+class ReferenceCache:
+    """Short-TTL map of username -> user id and project title -> project id.
+
+    Only found references are cached, so a user or project is visible the
+    moment it is created; the update and delete routes invalidate entries,
+    and the TTL bounds how stale other processes can be.
+    """
+
+    def __init__(self, ttl=30, maxsize=4096):
+        self.ttl = ttl
+        self._entries = LRU(maxsize)
+
+    def get(self, key):
+        entry = self._entries.get(key, valid=lambda entry: entry[1] > time.monotonic())
+        return entry[0] if entry is not None else None
+
+    def set(self, key, value):
+        if self.ttl:
+            self._entries.set(key, (value, time.monotonic() + self.ttl))
+
+    def invalidate(self, key):
+        self._entries.pop(key)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return dict(self._entries.stats(), ttl=self.ttl)
+
+
+def cache():
+    return current_app.extensions['reference_cache']
+
+
+def resolve(username=None, title=None):
+    """Return (user_id, project_id) for the given username / project title.
+
+    Either is None when not asked for or not found. Whatever the cache
+    can't answer is looked up in one combined SELECT.
+    """
+    references = cache()
+    user_id = references.get(('user', username)) if username else None
+    project_id = references.get(('project', title)) if title else None
+
+    lookups = []
+    if username and user_id is None:
+        lookups.append(('user', username, select(User.id).where(User.username == username)))
+    if title and project_id is None:
+        lookups.append(('project', title, select(Project.id).where(Project.title == title)))
+    if lookups:
+        row = db.session.execute(select(*[query.scalar_subquery() for _, _, query in lookups])).one()
+        for (kind, key, _), value in zip(lookups, row):
+            if value is None:
+                continue
+            references.set((kind, key), value)
+            if kind == 'user':
+                user_id = value
+            else:
+                project_id = value
+    return user_id, project_id
+
+
+def invalidate_user(username):
+    cache().invalidate(('user', username))
+
+
+def invalidate_project(title):
+    cache().invalidate(('project', title))
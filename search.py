@@ -0,0 +1,130 @@
+"""Full-text search over projects, vote comments and chat messages (SQLite FTS5).
+
+Each searchable table has an external-content FTS5 index kept in sync by
+triggers, so the CRUD routes, bulk ingestion and seed.py need no changes.
+The indexes are created with the other tables by db.create_all(), and by
+migration 5 for existing databases.
+"""
+import re
+
+from sqlalchemy import event, text
+
+from models import db
+
+# table -> (index, indexed columns, bm25 column weights)
+INDEXES = {
+    'project': ('project_fts', ('title', 'description'), (10.0, 1.0)),
+    'vote': ('vote_fts', ('comment',), (1.0,)),
+    'chat_message': ('chat_message_fts', ('content',), (1.0,)),
+}
+
+TYPES = ('project', 'vote', 'chat')
+
+SNIPPET_TOKENS = 12
+
+
+def statements(table):
+    index, columns, weights = INDEXES[table]
+    cols = ', '.join(columns)
+    new = ', '.join('new.%s' % column for column in columns)
+    old = ', '.join('old.%s' % column for column in columns)
+    delete = "INSERT INTO %s (%s, rowid, %s) VALUES ('delete', old.id, %s);" % (index, index, cols, old)
+    insert = 'INSERT INTO %s (rowid, %s) VALUES (new.id, %s);' % (index, cols, new)
+    return [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, content='%s', content_rowid='id', "
+        "tokenize='porter unicode61')" % (index, cols, table),
+        "INSERT INTO %s (%s, rank) VALUES ('rank', 'bm25(%s)')" % (index, index, ', '.join(map(str, weights))),
+        'CREATE TRIGGER IF NOT EXISTS %s_ai AFTER INSERT ON %s BEGIN %s END' % (index, table, insert),
+        'CREATE TRIGGER IF NOT EXISTS %s_ad AFTER DELETE ON %s BEGIN %s END' % (index, table, delete),
+        # Only reindex when an indexed column changes, not on status or counter updates
+        'CREATE TRIGGER IF NOT EXISTS %s_au AFTER UPDATE OF %s ON %s BEGIN %s %s END' % (
+            index, cols, table, delete, insert),
+        "INSERT INTO %s (%s) VALUES ('rebuild')" % (index, index),
+    ]
+
+
+def install(execute, tables=INDEXES):
+    """Create the indexes and triggers for tables and (re)build them from the table contents."""
+    for table in tables:
+        for statement in statements(table):
+            execute(statement)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_indexes(target, connection, tables=(), **kw):
+    # Only for tables this create_all() just made; existing databases get them from migration 5
+    if connection.dialect.name != 'sqlite':
+        return
+    created = [table.name for table in tables if table.name in INDEXES]
+    install(connection.exec_driver_sql, created)
+
+
+def available():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def match_query(q):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix."""
+    words = re.findall(r'\w+', q, re.UNICODE)
+    if not words:
+        return None
+    terms = ['"%s"' % word for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def snippet(index):
+    return "snippet(%s, -1, '<mark>', '</mark>', '…', %d)" % (index, SNIPPET_TOKENS)
+
+
+QUERIES = {
+    'project': (
+        "SELECT 'project', p.id, highlight(project_fts, 0, '<mark>', '</mark>'), %s, project_fts.rank, p.title "
+        'FROM project_fts JOIN project p ON p.id = project_fts.rowid '
+        'WHERE project_fts MATCH :q ORDER BY project_fts.rank LIMIT :n' % snippet('project_fts')
+    ),
+    'vote': (
+        "SELECT 'vote', v.id, v.project_title, %s, vote_fts.rank, v.project_title "
+        'FROM vote_fts JOIN vote v ON v.id = vote_fts.rowid '
+        'WHERE vote_fts MATCH :q ORDER BY vote_fts.rank LIMIT :n' % snippet('vote_fts')
+    ),
+    # Transcripts are private: only the caller's own sessions, without the system prompt
+    'chat': (
+        "SELECT 'chat', m.id, 'Chat ' || m.session_id, %s, chat_message_fts.rank, m.session_id "
+        'FROM chat_message_fts JOIN chat_message m ON m.id = chat_message_fts.rowid '
+        'JOIN chat_session s ON s.id = m.session_id '
+        'WHERE chat_message_fts MATCH :q AND s.user_id = :user_id AND m.content != :context '
+        'ORDER BY chat_message_fts.rank LIMIT :n' % snippet('chat_message_fts')
+    ),
+}
+
+EXTRA = {'project': 'project_title', 'vote': 'project_title', 'chat': 'session_id'}
+
+
+def search(q, types=TYPES, limit=20, offset=0, user_id=None, context=''):
+    """Return (results, has_more) for q, best matches first across the requested types.
+
+    Each type is ranked inside its own index with LIMIT offset + limit + 1,
+    so a page never scores or reads more rows than it could return.
+    """
+    query = match_query(q)
+    if query is None:
+        return [], False
+    wanted = offset + limit + 1
+    rows = []
+    for kind in types:
+        if kind == 'chat' and user_id is None:
+            continue
+        rows.extend(db.session.execute(text(QUERIES[kind]), {
+            'q': query, 'n': wanted, 'user_id': user_id, 'context': context
+        }).all())
+    rows.sort(key=lambda row: row[4])
+    page = rows[offset:offset + limit]
+    return [{
+        'type': kind,
+        'id': id,
+        'title': title,
+        'snippet': text_snippet,
+        'score': round(-rank, 6),
+        EXTRA[kind]: extra
+    } for kind, id, title, text_snippet, rank, extra in page], len(rows) > offset + limit
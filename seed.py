@@ -0,0 +1,231 @@
+"""Fill a database with synthetic users, projects, votes, contributions, budgets and expenses.
+
+Data is generated deterministically from --seed in chunks, inserted with
+one executemany per chunk, and project_stats / table_version are kept in
+step, so the API behaves as if the rows had come in through it.
+Usernames and project titles start with --prefix; use a new prefix to
+seed the same database twice.
+
+    flask --app app seed --votes 1000000 --projects 100000
+    python seed.py sqlite:////tmp/big.db --users 50000 --projects 100000 --votes 1000000
+"""
+import argparse
+import datetime
+import random
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert
+
+from models import db, User, Project, Vote, Contribution, Budget, Expense, ProjectStats
+import passwords
+import versions
+
+CHUNK_SIZE = 10000
+
+DEFAULTS = {
+    'users': 1000,
+    'projects': 1000,
+    'votes': 100000,
+    'contributions': 50000,
+    'budgets': 1000,
+    'expenses': 50000,
+}
+
+THEMES = ['community garden', 'youth football club', 'library corner', 'street clean-up', 'food bank',
+          'repair cafe', 'mural', 'coding club', 'play area', 'bike workshop', 'choir', 'allotment']
+PLACES = ['Aston', 'Digbeth', 'Erdington', 'Handsworth', 'Moseley', 'Selly Oak', 'Sparkhill', 'Kings Heath']
+STATUSES = ['proposed'] * 6 + ['approved'] * 2 + ['in_progress', 'completed']
+COMMENTS = ['Great idea!', 'Would love to help out.', 'Not sure about the cost.', 'Much needed here.',
+            'Could this be bigger?', 'Happy to volunteer on weekends.']
+CATEGORIES = ['mandatory'] * 3 + ['essential'] * 3 + ['discretionary'] * 2 + ['venue', 'materials', 'food', 'transport']
+
+
+class Generator:
+    def __init__(self, seed=1, days=365, prefix='seed', now=None):
+        self.rng = random.Random(seed)
+        self.now = now or datetime.datetime.utcnow()
+        self.start = self.now - datetime.timedelta(days=days)
+        self.prefix = prefix
+
+    def date_after(self, earliest):
+        span = (self.now - earliest).total_seconds()
+        return earliest + datetime.timedelta(seconds=self.rng.random() * span)
+
+    def amount(self, median, sigma=0.8):
+        return round(self.rng.lognormvariate(0, sigma) * median, 2)
+
+    def skewed(self, count):
+        # Low indexes are picked far more often, like a few popular projects getting most votes
+        return int(count * self.rng.random() ** 2.5)
+
+    def username(self, n):
+        return '%suser%d' % (self.prefix, n)
+
+    def title(self, n):
+        rng = self.rng
+        return '%s %s %s %d' % (self.prefix.capitalize(), rng.choice(PLACES), rng.choice(THEMES), n)
+
+
+def chunks(count, size=CHUNK_SIZE):
+    for start in range(0, count, size):
+        yield range(start, min(count, start + size))
+
+
+def insert_rows(model, rows):
+    if rows:
+        db.session.execute(insert(model), rows)
+        db.session.commit()
+
+
+def seed(users, projects, votes, contributions, budgets, expenses, seed=1, days=365, prefix='seed',
+         password='password', log=print):
+    """Generate and insert the given number of rows of each kind; returns the counts."""
+    gen = Generator(seed, days, prefix)
+    rng = gen.rng
+    # One hash shared by every seeded user; hashing each would take longer than the whole seed
+    stored = passwords.hash_password(password, current_app.config.get('PASSWORD_HASH_METHOD', passwords.DEFAULT_METHOD))
+
+    for chunk in chunks(users):
+        insert_rows(User, [{'name': '%s User %d' % (prefix.capitalize(), n), 'username': gen.username(n),
+                            'password': stored} for n in chunk])
+    log('users: %d' % users)
+
+    last_id = db.session.query(func.coalesce(func.max(Project.id), 0)).scalar()
+    titles = []
+    created = []
+    for chunk in chunks(projects):
+        rows = []
+        for n in chunk:
+            titles.append(gen.title(n))
+            created.append(gen.date_after(gen.start))
+            rows.append({
+                'title': titles[-1],
+                'description': 'A %s for local residents, run by volunteers.' % rng.choice(THEMES),
+                'status': rng.choice(STATUSES),
+                'budget': gen.amount(2000, 1.0),
+                'created_by': gen.username(rng.randrange(users)),
+                'created_at': created[-1]
+            })
+        insert_rows(Project, rows)
+    ids = dict(db.session.query(Project.title, Project.id).filter(Project.id > last_id))
+    project_ids = [ids[title] for title in titles]
+    counters = [[0, 0, 0, 0.0] for _ in range(projects)]  # up, down, contributions, contributed
+    log('projects: %d' % projects)
+
+    for chunk in chunks(votes if projects else 0):
+        rows = []
+        for _ in chunk:
+            p = gen.skewed(projects)
+            vote_type = 'up' if rng.random() < 0.75 else 'down'
+            counters[p][0 if vote_type == 'up' else 1] += 1
+            rows.append({
+                'user_username': gen.username(rng.randrange(users)),
+                'project_title': titles[p],
+                'project_id': project_ids[p],
+                'vote_type': vote_type,
+                'comment': rng.choice(COMMENTS) if rng.random() < 0.3 else None,
+                'date': gen.date_after(created[p])
+            })
+        insert_rows(Vote, rows)
+    log('votes: %d' % votes)
+
+    for chunk in chunks(contributions if projects else 0):
+        rows = []
+        for _ in chunk:
+            p = gen.skewed(projects)
+            amount = gen.amount(25)
+            counters[p][2] += 1
+            counters[p][3] += amount
+            rows.append({
+                'user_username': gen.username(rng.randrange(users)),
+                'project_title': titles[p],
+                'project_id': project_ids[p],
+                'amount': amount,
+                'date': gen.date_after(created[p])
+            })
+        insert_rows(Contribution, rows)
+    log('contributions: %d' % contributions)
+
+    for chunk in chunks(projects):
+        insert_rows(ProjectStats, [{
+            'project_id': project_ids[p],
+            'votes_up': counters[p][0],
+            'votes_down': counters[p][1],
+            'votes_total': counters[p][0] + counters[p][1],
+            'contributions': counters[p][2],
+            'contributed': round(counters[p][3], 2)
+        } for p in chunk])
+
+    for chunk in chunks(budgets):
+        rows = []
+        for n in chunk:
+            buckets = [gen.amount(median) for median in (800, 400, 200)]
+            rows.append({
+                'name': '%s budget %d' % (rng.choice(THEMES).capitalize(), n),
+                'mandatory': buckets[0],
+                'essential': buckets[1],
+                'discretionary': buckets[2],
+                'total': round(sum(buckets), 2),
+                'created_by': gen.username(rng.randrange(users)),
+                'created_at': gen.date_after(gen.start)
+            })
+        insert_rows(Budget, rows)
+    log('budgets: %d' % budgets)
+
+    for chunk in chunks(expenses):
+        rows = []
+        for _ in chunk:
+            p = gen.skewed(projects) if projects and rng.random() < 0.8 else None
+            rows.append({
+                'description': rng.choice(['Paint', 'Hall hire', 'Tools', 'Snacks', 'Printing', 'Bus fares', 'Seeds']),
+                'amount': gen.amount(40),
+                'category': rng.choice(CATEGORIES),
+                'project_title': titles[p] if p is not None else None,
+                'project_id': project_ids[p] if p is not None else None,
+                'created_by': gen.username(rng.randrange(users)),
+                'date': gen.date_after(created[p] if p is not None else gen.start)
+            })
+        insert_rows(Expense, rows)
+    log('expenses: %d' % expenses)
+
+    versions.bump('user', 'project', 'vote', 'contribution', 'budget', 'expense')
+    db.session.commit()
+    return {'users': users, 'projects': projects, 'votes': votes, 'contributions': contributions,
+            'budgets': budgets, 'expenses': expenses}
+
+
+def count_options(command):
+    for name, default in reversed(list(DEFAULTS.items())):
+        command = click.option('--%s' % name, type=int, default=default, show_default=True)(command)
+    return command
+
+
+@click.command('seed')
+@count_options
+@click.option('--seed', 'seed_value', type=int, default=1, show_default=True, help='Random seed.')
+@click.option('--days', type=int, default=365, show_default=True, help='Spread dates over this many days.')
+@click.option('--prefix', default='seed', show_default=True, help='Prefix for usernames and project titles.')
+@with_appcontext
+def seed_command(seed_value, days, prefix, **counts):
+    """Fill the database with synthetic data."""
+    seed(seed=seed_value, days=days, prefix=prefix, log=click.echo, **counts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database_url')
+    for name, default in DEFAULTS.items():
+        parser.add_argument('--%s' % name, type=int, default=default)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--prefix', default='seed')
+    args = parser.parse_args()
+
+    from app import create_app, init_db
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url})
+    with app.app_context():
+        init_db()
+        seed(**{name: getattr(args, name) for name in DEFAULTS},
+             seed=args.seed, days=args.days, prefix=args.prefix)
@@ -0,0 +1,56 @@
+from models import db, Project, ProjectStats
+
+COUNTERS = ('votes_up', 'votes_down', 'votes_total', 'contributions', 'contributed')
+
+
+def adjust(project_id, **deltas):
+    """Add deltas to a project's counters in the current transaction."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if project_id is None or not deltas:
+        return
+    table = ProjectStats.__table__
+    # Increment in SQL so concurrent writers can't lose each other's updates. The row is created
+    # with the project, so a missing one means the project is gone: never recreate it from here.
+    db.session.execute(
+        table.update()
+        .where(table.c.project_id == project_id)
+        .values({name: table.c[name] + delta for name, delta in deltas.items()})
+    )
+
+
+def vote_deltas(vote_type, sign=1):
+    return {
+        'votes_total': sign,
+        'votes_up': sign if vote_type == 'up' else 0,
+        'votes_down': sign if vote_type == 'down' else 0
+    }
+
+
+def vote_change_deltas(old_type, new_type):
+    old, new = vote_deltas(old_type, -1), vote_deltas(new_type)
+    return {name: old[name] + new[name] for name in old}
+
+
+def contribution_deltas(amount, sign=1):
+    return {'contributions': sign, 'contributed': sign * (amount or 0)}
+
+
+def to_dict(project, stats):
+    contributed = stats.contributed if stats else 0
+    return {
+        'project_id': project.id,
+        'project_title': project.title,
+        'budget': project.budget,
+        'votes_up': stats.votes_up if stats else 0,
+        'votes_down': stats.votes_down if stats else 0,
+        'votes_total': stats.votes_total if stats else 0,
+        'contributions': stats.contributions if stats else 0,
+        'contributed': contributed,
+        'funded_pct': round(100.0 * contributed / project.budget, 2) if project.budget else None
+    }
+
+
+def stats_query():
+    return db.session.query(Project, ProjectStats).outerjoin(
+        ProjectStats, ProjectStats.project_id == Project.id
+    )
@@ -0,0 +1,73 @@
+import datetime
+import hashlib
+from functools import wraps
+
+from flask import request, make_response
+
+from models import db, TableVersion
+
+
+def bump(*names):
+    """Advance the version of each named table in the current transaction."""
+    table = TableVersion.__table__
+    now = datetime.datetime.utcnow()
+    for name in names:
+        result = db.session.execute(
+            table.update()
+            .where(table.c.name == name)
+            .values(version=table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(name=name, version=1, updated_at=now))
+
+
+def current(names):
+    """Return ({name: version}, last_modified) for the named tables in one query."""
+    rows = db.session.query(TableVersion.name, TableVersion.version, TableVersion.updated_at).filter(
+        TableVersion.name.in_(names)
+    ).all()
+    found = {name: version for name, version, _ in rows}
+    last_modified = max((updated_at for _, _, updated_at in rows), default=None)
+    return {name: found.get(name, 0) for name in names}, last_modified
+
+
+def conditional(*names):
+    """Serve 304s for unchanged data on a read route that depends on the named tables.
+
+    The ETag combines the table versions with the request path and query
+    string. A matching If-None-Match (or an If-Modified-Since no older than
+    the last write) is answered before the view runs, so polling clients
+    cost one primary-key lookup between changes.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Read versions before the rows: a write in between only makes the tag stale, never wrong
+            found, last_modified = current(names)
+            key = '%s|%s' % (request.full_path, ','.join('%s=%d' % item for item in sorted(found.items())))
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+            if last_modified is not None:
+                # HTTP dates have one-second resolution, so a write in the current second could be
+                # followed by another with the same timestamp; only advertise settled seconds
+                if datetime.datetime.utcnow() - last_modified < datetime.timedelta(seconds=1):
+                    last_modified = None
+                else:
+                    last_modified = last_modified.replace(microsecond=0, tzinfo=datetime.timezone.utc)
+
+            if request.if_none_match:
+                unchanged = etag in request.if_none_match
+            else:
+                since = request.if_modified_since
+                unchanged = bool(since and last_modified and last_modified <= since)
+            if unchanged:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator